@@ -0,0 +1,83 @@
+"""
+Neighbor lookup benchmark on ring rich molecules.
+
+Times figueras.sssr alone and the whole smilin, cansmiles, ecfp
+pipeline with the indexed Atom.findbond and identity based Bond.xatom
+against the original handle scanning versions (kept below and patched
+in for the "scan" timings).
+
+    python benchmarks/adjacency.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.mol import Atom, Bond
+from pinky.smiles import smilin
+from pinky.fingerprints import ecfp
+from pinky.perception import figueras
+
+MOLECULES = [
+    ("cubane", "C12C3C4C1C5C4C3C25"),
+    ("adamantane", "C1C2CC3CC1CC(C2)C3"),
+    ("cholesterol", "CC(C)CCCC(C)C1CCC2C1(CCC3C2CC=C4C3(CCC(C4)O)C)C"),
+    ("coronene", "c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67"),
+    ("dodecahedrane",
+     "C12C3C4C5C1C6C7C2C8C3C9C4C%10C5C6C%11C7C8C9C%10%11"),
+    ("fullerene C60",
+     "c12c3c4c5c1c6c7c8c2c9c1c3c2c3c4c4c%10c5c5c6c6c7c7c%11c8c9c8c9c1c2"
+     "c1c2c3c4c3c4c%10c5c5c6c6c7c7c%11c8c8c9c1c1c2c3c2c4c5c6c3c7c8c1c23"),
+]
+
+def scan_findbond(self, otherAtom):
+    """The original Atom.findbond"""
+    handle = otherAtom.handle
+    for atom, bond in zip(self.oatoms, self.bonds):
+        if handle == atom.handle:
+            return bond
+    return None
+
+def scan_xatom(self, atom):
+    """The original Bond.xatom"""
+    handle = atom.handle
+    if handle == self.atoms[0].handle:
+        return self.atoms[1]
+    elif handle == self.atoms[1].handle:
+        return self.atoms[0]
+    return None
+
+def pipeline(smiles):
+    mol = smilin(smiles)
+    mol.cansmiles()
+    ecfp(mol, 3)
+
+def timed(func, arg, number):
+    """best seconds per call of func(arg) with the scanning and with
+    the indexed lookups"""
+    indexed = (Atom.findbond, Bond.xatom)
+    Atom.findbond, Bond.xatom = scan_findbond, scan_xatom
+    try:
+        old = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    finally:
+        Atom.findbond, Bond.xatom = indexed
+    new = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return old / number, new / number
+
+def main(number=20):
+    print("%-16s %6s %6s %20s %20s" % ("molecule", "atoms", "rings",
+                                       "sssr scan/indexed",
+                                       "pipeline scan/indexed"))
+    for name, smiles in MOLECULES:
+        mol = smilin(smiles)
+        unperceived = smilin(smiles, transforms=[])
+        sssr = timed(figueras.sssr, unperceived, number)
+        whole = timed(pipeline, smiles, number)
+        print("%-16s %6d %6d %7.2f/%.2fms %5.2fx %7.2f/%.2fms %5.2fx" % (
+            name, len(mol.atoms), len(mol.cycles),
+            1000 * sssr[0], 1000 * sssr[1], sssr[0] / sssr[1],
+            1000 * whole[0], 1000 * whole[1], whole[0] / whole[1]))
+
+if __name__ == "__main__":
+    main()
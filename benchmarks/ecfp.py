@@ -0,0 +1,111 @@
+"""
+ECFP benchmark and regression check on large molecules.
+
+Times pinky.fingerprints.ecfp against the original deepcopy/list based
+layer loop (kept below as reference_ecfp) and checks both produce the
+same fingerprint.  Then times ecfp_batch against per molecule
+ecfp_counts over the test SMILES.
+
+    python benchmarks/ecfp.py
+"""
+import copy
+import os
+import sys
+import timeit
+
+from bitarray import bitarray
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.smiles import smilin
+from pinky.fingerprints import ecfp, ecfp_counts, hash32
+from pinky.fingerprints.ecfp import gen_hash, invariants
+
+MOLECULES = [
+    ("alkane C200", "C" * 200),
+    ("poly-alanine 60", "N" + "C(C)C(=O)N" * 60 + "C(=O)O"),
+    ("cyclic peptide 40", "N1" + "C(C)C(=O)N" * 39 + "C(C)C1=O"),
+    ("macrocycle C120", "C1" + "C" * 118 + "C1"),
+    ("polyphenylene 30", "c1ccccc1" + "-c1ccc(cc1)" * 29 + "C"),
+]
+
+def reference_ecfp(mol, radius=2):
+    """The original implementation of ecfp()"""
+    atom_ids = invariants(mol)
+
+    fp = {}
+    for i in atom_ids.values():
+        fp[i] = fp.get(i, 0) + 1
+
+    neighborhoods = []
+    atom_neighborhoods = [ len(mol.bonds) * bitarray('0') for a in mol.atoms]
+    dead_atoms = len(mol.atoms) * bitarray('0')
+
+    for layer in range(1, radius+1):
+        round_ids = {}
+        round_atom_neighborhoods = copy.deepcopy(atom_neighborhoods)
+        neighborhoods_this_round = []
+
+        for a in mol.atoms:
+            if dead_atoms[a.index]: continue
+
+            nbsr = []
+            for b in a.bonds:
+                round_atom_neighborhoods[a.index][b.index] = True
+                oidx = b.xatom(a).index
+                round_atom_neighborhoods[a.index] |= atom_neighborhoods[oidx]
+                nbsr.append((b.bondtype, atom_ids[oidx]))
+
+            nbsr = sorted(nbsr)
+            nbsr = [item for sublist in nbsr for item in sublist]
+            nbsr.insert(0, atom_ids[a.index])
+            nbsr.insert(0, layer)
+
+            round_ids[a.index] = gen_hash(nbsr)
+            neighborhoods_this_round.append(
+                (round_atom_neighborhoods[a.index], round_ids[a.index], a.index)
+            )
+
+        for lst in neighborhoods_this_round:
+            if lst[0] not in neighborhoods:
+                fp[lst[1]] = fp.get(lst[1], 0) + 1
+                neighborhoods.append(lst[0])
+            else:
+                dead_atoms[lst[2]] = True
+
+        atom_ids = round_ids
+        atom_neighborhoods = copy.deepcopy(round_atom_neighborhoods)
+    return fp
+
+def main(number=5):
+    print("%-20s %6s %12s %12s %8s" % ("molecule", "atoms", "reference",
+                                       "ecfp", "speedup"))
+    for name, smiles in MOLECULES:
+        mol = smilin(smiles)
+        for radius in (2, 3):
+            assert ecfp(mol, radius) == reference_ecfp(mol, radius), name
+        old = timeit.timeit(lambda: reference_ecfp(mol, 3), number=number)
+        new = timeit.timeit(lambda: ecfp(mol, 3), number=number)
+        print("%-20s %6d %10.2fms %10.2fms %7.1fx" % (
+            name, len(mol.atoms), 1000 * old / number, 1000 * new / number,
+            old / new))
+
+def batch(repeat=10):
+    from pinky.fingerprints.batch import ecfp_batch
+
+    path = os.path.join(os.path.dirname(__file__), os.pardir, "tests",
+                        "smiles.txt")
+    with open(path) as fh:
+        mols = [smilin(line.strip()) for line in fh] * repeat
+
+    single = timeit.timeit(
+        lambda: [ecfp_counts(mol, 2, 2048, hash32) for mol in mols], number=1)
+    batched = timeit.timeit(lambda: ecfp_batch(mols, 2, 2048, dense=True),
+                            number=1)
+    print()
+    print("%d molecules: ecfp_counts %.2fs, ecfp_batch %.2fs (%.1fx)" % (
+        len(mols), single, batched, single / batched))
+
+if __name__ == "__main__":
+    main()
+    batch()
@@ -0,0 +1,72 @@
+"""
+Prime table benchmark.
+
+Times growing the table of primes FreedDisambiguate maps its symmetry
+classes through, by trial division as the original Primes did it
+(kept below) and by the doubling sieve, then the cost of get() on a
+grown table.  Every timing uses tables of its own, the shared
+primes.primes is never touched.
+
+    python benchmarks/primes.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.canonicalization import primes
+
+class TrialDivisionPrimes:
+    """The original Primes, with a copy of its 400 precomputed primes"""
+    def __init__(self):
+        self.primes = list(primes.Primes().primes[:400])
+
+    def _findNextPrime(self, N):
+        primes = self.primes
+        nextPrime = primes[-1]+1
+        while(len(primes)<N):
+            maximum = nextPrime * nextPrime
+            prime = 1
+            for i in primes:
+                if i > maximum:
+                    break
+                if nextPrime % i == 0:
+                    prime = 0
+                    break
+            if prime:
+                primes.append(nextPrime)
+            nextPrime+=1
+
+    def __getitem__(self, i):
+        assert i>=0, "Index must be greater than 0!"
+        if i >= len(self.primes)-1:
+            self._findNextPrime(i+1)
+        return self.primes[i]
+
+    def get(self, i):
+        return self[i]
+
+def best(func, number=1):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+def main():
+    print("%-28s %22s" % ("", "trial division/sieve"))
+    # a 1200 atom molecule needs up to 2 * 1200 + 2 primes
+    for n in (2000, 2402, 5000, 10000):
+        old = best(lambda: TrialDivisionPrimes().get(n))
+        new = best(lambda: primes.Primes().get(n))
+        print("%-28s %8.2f/%.2fms %6.1fx" % ("grow to %d primes" % n,
+                                            1000 * old, 1000 * new,
+                                            old / new))
+
+    indices = list(range(2000)) * 50
+    table, sieved = TrialDivisionPrimes(), primes.Primes()
+    table.get(2000)
+    old = best(lambda: list(map(table.get, indices)), 5)
+    new = best(lambda: list(map(sieved.get, indices)), 5)
+    print("%-28s %8.2f/%.2fms %6.1fx" % ("100000 get()", 1000 * old,
+                                        1000 * new, old / new))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Canonical ranking benchmark on symmetric molecules.
+
+Times the two Molecule.cansmiles ranking engines, the prime product
+FreedDisambiguate ("freed") and PartitionRefinement ("refine"), on
+their own and as part of the whole cansmiles.  The "ties" column times
+FreedDisambiguate with the original tie breaking, which doubles every
+symmetry order and converges the whole graph again for every tie
+(kept below and patched in), against the cell based one.
+
+    python benchmarks/ranking.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.smiles import smilin
+from pinky.mol.molecule import RANKINGS
+from pinky.canonicalization.disambiguate import FreedDisambiguate
+from pinky.canonicalization.equiv import compute_equiv_class
+
+def alkane(n):
+    return "C" * n
+
+def star(depth):
+    """SMILES of a tree of quaternary carbons, depth levels deep"""
+    if depth == 0:
+        return "C"
+    branch = star(depth - 1)
+    return "C(%s)(%s)(%s)%s" % (branch, branch, branch, branch)
+
+MOLECULES = [
+    ("cubane", "C12C3C4C1C5C4C3C25"),
+    ("adamantane", "C1C2CC3CC1CC(C2)C3"),
+    ("coronene", "c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67"),
+    ("dodecahedrane",
+     "C12C3C4C5C1C6C7C2C8C3C9C4C%10C5C6C%11C7C8C9C%10%11"),
+    ("fullerene C60",
+     "c12c3c4c5c1c6c7c8c2c9c1c3c2c3c4c4c%10c5c5c6c6c7c7c%11c8c9c8c9c1c2"
+     "c1c2c3c4c3c4c%10c5c5c6c6c7c7c%11c8c8c9c1c1c2c3c2c4c5c6c3c7c8c1c23"),
+    ("PEG 20", "O" + "CCO" * 20),
+    ("alkane C100", alkane(100)),
+    ("star depth 3", star(3)),
+]
+
+def doubling_findInvariantPartitioning(self):
+    """The original FreedDisambiguate.findInvariantPartitioning"""
+    symorders = self.symorders[:]
+    _range = range(len(symorders))
+    while 1:
+        pos = self.findLowest(symorders)
+        if pos == -1:
+            self.symorders = symorders
+            return
+        for i in _range:
+            symorders[i] = symorders[i] * 2 + 1
+        symorders[pos] = symorders[pos] - 1
+        symorders = self.findInvariant(symorders)
+
+def ranked(mol, ranking):
+    RANKINGS[ranking](mol)
+
+def whole(mol, ranking):
+    mol.dirty = 1
+    mol.cansmiles(ranking=ranking)
+
+def best(func, mol, ranking, number):
+    return min(timeit.repeat(lambda: func(mol, ranking),
+                             number=number, repeat=5)) / number
+
+def main(number=10):
+    print("%-16s %6s %24s %24s %24s" % ("molecule", "atoms",
+                                        "ties doubling/cells",
+                                        "ranking freed/refine",
+                                        "cansmiles freed/refine"))
+    for name, smiles in MOLECULES:
+        mol = smilin(smiles)
+        for atom in mol.atoms:
+            atom.equiv_class = compute_equiv_class(atom)
+        cells = FreedDisambiguate.findInvariantPartitioning
+        FreedDisambiguate.findInvariantPartitioning = \
+            doubling_findInvariantPartitioning
+        try:
+            doubling = best(ranked, mol, "freed", number)
+        finally:
+            FreedDisambiguate.findInvariantPartitioning = cells
+        rank = [best(ranked, mol, ranking, number)
+                for ranking in ("freed", "refine")]
+        can = [best(whole, mol, ranking, number)
+               for ranking in ("freed", "refine")]
+        print("%-16s %6d %9.2f/%.2fms %5.2fx %9.2f/%.2fms %5.2fx "
+              "%9.2f/%.2fms %5.2fx" % (
+            name, len(mol.atoms),
+            1000 * doubling, 1000 * rank[0], doubling / rank[0],
+            1000 * rank[0], 1000 * rank[1], rank[0] / rank[1],
+            1000 * can[0], 1000 * can[1], can[0] / can[1]))
+
+if __name__ == "__main__":
+    main()
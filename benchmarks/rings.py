@@ -0,0 +1,117 @@
+"""
+Ring perception benchmark on fused polycyclics.
+
+Times figueras.sssr on steroids, cages, fused aromatics, a fullerene
+and a series of ever longer perhydroacene ladders, with the index and
+bitset based getRing and with the original dictionary path version
+(kept below and patched in for the "dict" timings).
+
+    python benchmarks/rings.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.smiles import smilin
+from pinky.perception import figueras
+
+def ladder(n):
+    """SMILES of n linearly fused cyclohexanes"""
+    label = lambda k: "%%%d" % k if k > 9 else str(k)
+    return "".join(["C1CCC2"] +
+                   ["CC" + label(k) for k in range(3, n + 1)] +
+                   ["CCCCC" + label(n)] +
+                   ["CC" + label(k) for k in range(n - 1, 1, -1)] +
+                   ["C1"]) if n > 1 else "C1CCCCC1"
+
+MOLECULES = [
+    ("estradiol", "CC12CCC3c4ccc(O)cc4CCC3C1CCC2O"),
+    ("cholesterol", "CC(C)CCCC(C)C1CCC2C1(CCC3C2CC=C4C3(CCC(C4)O)C)C"),
+    ("digitoxigenin", "CC12CCC(CC1CCC3C2CCC4(C3(CCC4C5=CC(=O)OC5)O)C)O"),
+    ("adamantane", "C1C2CC3CC1CC(C2)C3"),
+    ("cubane", "C12C3C4C1C5C4C3C25"),
+    ("dodecahedrane",
+     "C12C3C4C5C1C6C7C2C8C3C9C4C%10C5C6C%11C7C8C9C%10%11"),
+    ("pyrene", "c1cc2ccc3cccc4ccc(c1)c2c34"),
+    ("coronene", "c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67"),
+    ("fullerene C60",
+     "c12c3c4c5c1c6c7c8c2c9c1c3c2c3c4c4c%10c5c5c6c6c7c7c%11c8c9c8c9c1c2"
+     "c1c2c3c4c3c4c%10c5c5c6c6c7c7c%11c8c8c9c1c1c2c3c2c4c5c6c3c7c8c1c23"),
+] + [("ladder %d" % n, ladder(n)) for n in (4, 8, 16, 32)]
+
+def dict_getRing(startAtom, atomSet, lookup, oatoms, work=None):
+    """The original figueras.getRing"""
+    path = {}
+    bpaths = {}
+    for atomID in atomSet.keys():
+        path[atomID] = None
+        bpaths[atomID] = []
+
+    q = []
+    handle = startAtom.handle
+    for atom in oatoms[handle]:
+        q.append((atom, handle))
+        path[atom.handle] = {atom.handle:1, handle:1}
+        bpaths[atom.handle] = [startAtom.findbond(atom)]
+
+    qIndex = 0
+    lenQ = len(q)
+    while qIndex < lenQ:
+        current, sourceHandle = q[qIndex]
+        handle = current.handle
+        qIndex += 1
+        for next in oatoms[handle]:
+            m = next.handle
+            if m != sourceHandle:
+                if not m in atomSet:
+                    return (), ()
+                if path.get(m, None):
+                    intersections = 0
+                    for atom in path[handle].keys():
+                        if atom in path[m]:
+                            intersections = intersections + 1
+                            sharedAtom = atom
+                    if intersections == 1:
+                        del path[handle][sharedAtom]
+                        path[handle].update(path[m])
+                        result = path[handle].keys()
+                        bond = next.findbond(current)
+                        bonds = bpaths[handle] + bpaths[m] + [bond]
+                        return result, bonds
+                else:
+                    path[m] = path[handle].copy()
+                    path[m][m] = 1
+                    bond = next.findbond(current)
+                    bpaths[m] = bpaths[handle] + [bond]
+                    q.append((next, handle))
+                    lenQ = lenQ + 1
+    return (), ()
+
+def timed(mol, number):
+    """best seconds per figueras.sssr(mol) with the dictionary and with
+    the indexed getRing"""
+    indexed = figueras.getRing
+    figueras.getRing = dict_getRing
+    try:
+        old = min(timeit.repeat(lambda: figueras.sssr(mol),
+                                number=number, repeat=5))
+    finally:
+        figueras.getRing = indexed
+    new = min(timeit.repeat(lambda: figueras.sssr(mol),
+                            number=number, repeat=5))
+    return old / number, new / number
+
+def main(number=10):
+    print("%-16s %6s %6s %22s" % ("molecule", "atoms", "rings",
+                                  "sssr dict/indexed"))
+    for name, smiles in MOLECULES:
+        mol = smilin(smiles, transforms=[])
+        old, new = timed(mol, number)
+        print("%-16s %6d %6d %8.2f/%.2fms %5.2fx" % (
+            name, len(mol.atoms), len(mol.cycles),
+            1000 * old, 1000 * new, old / new))
+
+if __name__ == "__main__":
+    main()
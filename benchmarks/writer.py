@@ -0,0 +1,77 @@
+"""
+SMILES writer benchmark.
+
+Times traverse.draw, drawIsomeric and drawSmarts on the test SMILES
+and on a few large molecules, writing through token objects
+(SmilesTraversal and friends) and writing the text directly
+(SmilesWriter and friends, the default).  The atoms are ranked once
+up front so only the writing is timed.
+
+    python benchmarks/writer.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pinky.smiles import smilin
+from pinky.canonicalization import traverse, smiles
+
+SMILES = os.path.join(os.path.dirname(__file__), os.pardir,
+                      "tests", "smiles.txt")
+
+WRITERS = [
+    ("draw", smiles.SmilesTraversal, smiles.SmilesWriter),
+    ("drawIsomeric", smiles.IsomericSmilesTraversal,
+     smiles.IsomericSmilesWriter),
+    ("drawSmarts", smiles.SmartsTraversal, smiles.SmartsWriter),
+]
+
+def molecule_sets():
+    mols = [smilin(line.split()[0]) for line in open(SMILES)
+            if line.strip()]
+    return [
+        ("test smiles", mols),
+        ("alkane C1000", [smilin("C" * 1000)]),
+        ("polyglycine 250", [smilin("N" + "CC(=O)N" * 250 + "CC(=O)O")]),
+        ("coronene x50", [smilin("c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67")
+                          for i in range(50)]),
+    ]
+
+def drawable(mols, TraversalType):
+    """the molecules TraversalType can draw, isomeric drawing fails on
+    some ring closures at chiral atoms"""
+    result = []
+    for mol in mols:
+        try:
+            traverse.draw(mol, TraversalType)
+        except (AttributeError, KeyError):
+            continue
+        result.append(mol)
+    return result
+
+def drawn(mols, TraversalType):
+    for mol in mols:
+        traverse.draw(mol, TraversalType)
+
+def best(mols, TraversalType, number):
+    return min(timeit.repeat(lambda: drawn(mols, TraversalType),
+                             number=number, repeat=5)) / number
+
+def main(number=5):
+    print("%-16s %6s %-14s %22s" % ("molecules", "atoms", "draw",
+                                     "tokens/writer"))
+    for name, mols in molecule_sets():
+        for mol in mols:
+            mol.cansmiles()
+        for draw, tokens, writer in WRITERS:
+            drawn_mols = drawable(mols, tokens)
+            atoms = sum([len(mol.atoms) for mol in drawn_mols])
+            old = best(drawn_mols, tokens, number)
+            new = best(drawn_mols, writer, number)
+            print("%-16s %6d %-14s %8.2f/%.2fms %5.2fx" % (
+                name, atoms, draw, 1000 * old, 1000 * new, old / new))
+
+if __name__ == "__main__":
+    main()
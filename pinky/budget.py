@@ -0,0 +1,103 @@
+"""
+Work budgets for perception and canonicalization.
+
+A few records in real catalogs (large cages, polymers, fullerenes)
+keep figueras.sssr, aromaticity.aromatize or the canonical refinement
+in FreedDisambiguate busy for minutes.  The budgets bound the work spent
+on a single molecule:
+
+  atoms       most atoms ring perception, aromaticity and
+              canonicalization will take on
+  expansions  most atoms ring perception visits, summed over every
+              trimming pass and ring search
+  rounds      most passes of the aromaticity loop, and separately of
+              the canonical refinement
+
+Going over a budget raises TooComplexError, a PinkyError, so
+smilin_iter() and pinky.parallel report the record as failed and carry
+on with the batch.  Every budget is None (unlimited) until configured.
+
+    from pinky import budget
+
+    budget.configure(atoms=1000, expansions=1000000, rounds=10000)
+    ...
+    budget.trips()   # {'expansions': 2}, the budgets that were hit
+
+The configuration and the counters belong to the thread, so threads
+serving different callers can have different budgets and count their
+own trips.  A new thread starts with the budgets configured in the
+main thread and no trips.  Workers of pinky.parallel count their own
+trips as well.
+"""
+import threading
+from collections import Counter
+
+from .exceptions import TooComplexError
+
+BUDGETS = ("atoms", "expansions", "rounds")
+
+# the budgets of the main thread, where new threads start from
+_defaults = dict.fromkeys(BUDGETS)
+
+class _State(threading.local):
+    def __init__(self):
+        self.limits = dict(_defaults)
+        self.trips = Counter()
+
+_state = _State()
+
+def configure(**limits):
+    """(atoms=..., expansions=..., rounds=...)
+    Set some of the budgets of this thread, None is unlimited"""
+    for name, limit in limits.items():
+        if name not in _defaults:
+            raise ValueError("unknown budget %r" % name)
+        if limit is not None and limit < 0:
+            raise ValueError("budget %s must be >= 0" % name)
+    _state.limits.update(limits)
+    if threading.current_thread() is threading.main_thread():
+        _defaults.update(limits)
+
+def limits():
+    """-> {budget: limit} as configured for this thread"""
+    return dict(_state.limits)
+
+def trips():
+    """-> {budget: number of times it was exceeded in this thread}"""
+    return dict(_state.trips)
+
+def reset():
+    """Zero the trip counters of this thread"""
+    _state.trips.clear()
+
+def exceeded(name, limit):
+    """Count the trip and raise TooComplexError"""
+    _state.trips[name] += 1
+    raise TooComplexError(name, limit)
+
+def check_atoms(molecule):
+    """Raise TooComplexError if molecule has more atoms than allowed"""
+    limit = _state.limits["atoms"]
+    if limit is not None and len(molecule.atoms) > limit:
+        exceeded("atoms", limit)
+
+class Budget:
+    """The work left of one budget for one molecule, see start()"""
+    __slots__ = ("name", "limit", "left")
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.left = limit
+
+    def spend(self, work=1):
+        self.left -= work
+        if self.left < 0:
+            exceeded(self.name, self.limit)
+
+def start(name):
+    """(name)->Budget for one molecule, None if name is unlimited"""
+    limit = _state.limits[name]
+    if limit is None:
+        return None
+    return Budget(name, limit)
@@ -55,6 +55,7 @@ JCICS
 They do not talk about canonicalizing using bond types or stereo
 chemistry though.  See notes below for details.
 """
+from pinky import budget
 from pinky.canonicalization import primes
 from itertools import zip_longest
 
@@ -64,7 +65,13 @@ class FreedDisambiguate:
         
         given atom and bond equiv_classes use Freed's technique to
         find symmettry classes and symmetry orders for the graph
+
+        Raises TooComplexError when the graph goes over the atoms or
+        rounds budget, see pinky.budget
         """
+        budget.check_atoms(graph)
+        # one round is one pass of the disambiguation function
+        self.rounds = budget.start("rounds")
         self.graph = graph
         atoms = graph.atoms
         self.range = range(len(atoms))
@@ -220,8 +227,11 @@ class FreedDisambiguate:
         get = primes.primes.get
         disambiguate = self.disambiguate
         breakRankTies = self.breakRankTies
+        rounds = self.rounds
 
         while 1:
+            if rounds is not None:
+                rounds.spend()
             newSyms = map(get, symclasses)
             newSyms = disambiguate(newSyms)
             breakRankTies(symclasses, newSyms)
@@ -237,19 +247,72 @@ class FreedDisambiguate:
 
           [0, 1, 0, 1]
         should become
-          [0, 2, 1, 3]"""
-        
-        symorders = self.symorders[:]
-        _range = range(len(symorders))
+          [0, 2, 1, 3]
+
+        Each step ranks the lowest indexed atom of the lowest tie
+        first, as if every symmetry order was doubled and the atom's
+        order was lowered by one, and converges again like
+        findInvariant.  The atoms are kept in cells of equal symmetry
+        order and only the atoms of tied cells get a new
+        disambiguation value, atoms with a symmetry order of their own
+        can't move.  The results are the same as doubling and running
+        findInvariant over the whole graph."""
+        get = primes.primes.get
+        offsets = self.offsets
+        rounds = self.rounds
+        orders = self.symorders[:]
+
+        # the cells of atoms with the same symmetry order, by order
+        cells = {}
+        for index, order in enumerate(orders):
+            cells.setdefault(order, []).append(index)
+        cells = [cells[order] for order in sorted(cells)]
+
+        # all the cells before first have a single atom
+        first = 0
         while 1:
-            pos = self.findLowest(symorders)
-            if pos == -1:
-                self.symorders = symorders
+            while first < len(cells) and len(cells[first]) == 1:
+                first += 1
+            if first == len(cells):
+                self.symorders = orders
                 return
-            for i in _range:
-                symorders[i] = symorders[i] * 2 + 1
-            symorders[pos] = symorders[pos] - 1
-            
-            symorders = self.findInvariant(symorders)
-
 
+            cell = cells[first]
+            pos = min(cell)
+            values = [order * 2 + 1 for order in orders]
+            values[pos] -= 1
+            cells[first:first + 1] = [[pos], [i for i in cell if i != pos]]
+
+            while 1:
+                if rounds is not None:
+                    rounds.spend()
+                newCells = []
+                for cell in cells:
+                    if len(cell) == 1:
+                        newCells.append(cell)
+                        continue
+                    keyed = []
+                    for index in cell:
+                        val = 1
+                        for offset, bondtype in offsets[index]:
+                            val *= get(values[offset]) * bondtype
+                        keyed.append((val, index))
+                    keyed.sort()
+                    last = keyed[0][0]
+                    newCell = []
+                    for val, index in keyed:
+                        if val != last:
+                            newCells.append(newCell)
+                            newCell = []
+                            last = val
+                        newCell.append(index)
+                    newCells.append(newCell)
+                cells = newCells
+
+                # the new symmetry orders are the cell positions
+                for order, cell in enumerate(cells):
+                    for index in cell:
+                        orders[index] = order
+                if orders == values:
+                    break
+                values = orders[:]
@@ -0,0 +1,153 @@
+"""
+Partition refinement
+
+PartitionRefinement(graph)
+
+given atom and bond equiv_classes find the same symmetry classes and
+symmetry orders as FreedDisambiguate, without prime products.
+
+The atoms are kept in a single list ordered by rank, split into cells
+of atoms that are not told apart yet.  The label of an atom is the
+position of the first atom of its cell, so splitting a cell never
+changes the label of any atom outside of it.  A cell is split by
+sorting its atoms on the sorted tuple of (neighbor label, bondtype)
+pairs, and only the cells next to an atom whose label changed in the
+previous round are looked at again.  Every value involved is a small
+integer, however large or symmetric the graph is.
+
+Ties left at the end are broken like FreedDisambiguate does it: the
+atom with the lowest index in the lowest tied cell is ranked before
+the rest of its cell, and the refinement is run again, until every
+atom has its own cell.  The symmetry orders are then 0..N-1 and
+traverse.draw gives canonical SMILES, although not the same ones as
+with FreedDisambiguate since the cells are ordered differently.
+"""
+from pinky import budget
+
+class PartitionRefinement:
+    def __init__(self, graph):
+        """(graph)
+
+        given atom and bond equiv_classes find the symmetry classes
+        and symmetry orders of the graph by partition refinement
+
+        Raises TooComplexError when the graph goes over the atoms or
+        rounds budget, see pinky.budget
+        """
+        budget.check_atoms(graph)
+        # one round is one pass over the cells that need splitting
+        self.rounds = budget.start("rounds")
+        self.graph = graph
+        atoms = graph.atoms
+
+        indices = {}
+        for index, atom in enumerate(atoms):
+            indices[atom.handle] = index
+
+        # the (neighbor index, bondtype) pairs of every atom
+        self.neighbors = [[(indices[oatom.handle], bond.bondtype)
+                           for oatom, bond in zip(atom.oatoms, atom.bonds)]
+                          for atom in atoms]
+
+        # the initial cells are the atoms with the same equiv_class
+        classes = [atom.equiv_class for atom in atoms]
+        order = self.order = sorted(range(len(atoms)),
+                                    key=classes.__getitem__)
+        labels = self.labels = [0] * len(atoms)
+        # the end of each cell by cell label
+        ends = self.ends = {}
+        start = 0
+        for position in range(1, len(order) + 1):
+            if position == len(order) or \
+               classes[order[position]] != classes[order[start]]:
+                for index in order[start:position]:
+                    labels[index] = start
+                ends[start] = position
+                start = position
+
+        self.refine(range(len(atoms)))
+
+        # the symmetry classes are the labels ranked 0, 1, 2...
+        ranks = {}
+        for label in sorted(ends):
+            ranks[label] = len(ranks)
+        symclasses = self.symclasses = [ranks[label] for label in labels]
+
+        self.breakTies()
+        symorders = self.symorders = labels
+
+        # Give them back to the atoms
+        for atom, symclass, symorder in zip(atoms, symclasses, symorders):
+            atom.symclass = symclass
+            atom.symorder = symorder
+
+    def refine(self, changed):
+        """(changed) split the cells until no cell can be split,
+        changed are the indices of the atoms whose label changed"""
+        neighbors = self.neighbors
+        order = self.order
+        labels = self.labels
+        ends = self.ends
+        rounds = self.rounds
+
+        while changed:
+            if rounds is not None:
+                rounds.spend()
+            touched = set()
+            for index in changed:
+                for oindex, bondtype in neighbors[index]:
+                    label = labels[oindex]
+                    if ends[label] - label > 1:
+                        touched.add(label)
+
+            # sort every touched cell on the labels of this round
+            # before relabeling any of them
+            splits = []
+            for start in touched:
+                cell = [(tuple(sorted([(labels[oindex], bondtype)
+                                       for oindex, bondtype
+                                       in neighbors[index]])),
+                         index)
+                        for index in order[start:ends[start]]]
+                cell.sort()
+                if cell[0][0] != cell[-1][0]:
+                    splits.append((start, cell))
+
+            changed = []
+            for start, cell in splits:
+                end = ends[start]
+                label = start
+                last = cell[0][0]
+                for position, (signature, index) in enumerate(cell, start):
+                    if signature != last:
+                        ends[label] = position
+                        label = position
+                        last = signature
+                    order[position] = index
+                    if labels[index] != label:
+                        labels[index] = label
+                        changed.append(index)
+                ends[label] = end
+
+    def breakTies(self):
+        """rank the lowest indexed atom of the lowest tied cell
+        before the rest of its cell and refine, until there are no
+        ties"""
+        order = self.order
+        labels = self.labels
+        ends = self.ends
+        # cells only ever split, so the cells before start stay untied
+        start = 0
+        while start < len(order):
+            end = ends[start]
+            if end - start == 1:
+                start = end
+                continue
+            first = min(order[start:end])
+            rest = [index for index in order[start:end] if index != first]
+            order[start:end] = [first] + rest
+            ends[start] = start + 1
+            ends[start + 1] = end
+            for index in rest:
+                labels[index] = start + 1
+            self.refine(rest)
@@ -147,3 +147,90 @@ class SmartsTraversal(SmilesTraversal):
 
 class IsomericSmilesTraversal(SmilesTraversal):
     AtomToken = tokens.IsomericAtom
+
+class SmilesWriter:
+    """A SmilesTraversal that writes the smiles text straight into a
+    list of strings instead of building token objects.
+
+    The atom labels are only written by __str__: the closures of an
+    atom are not all known until the traversal is done, and isomeric
+    labels depend on the order the bonds were written in.  Gives the
+    same text as SmilesTraversal, but never modifies the atoms or bonds
+    it writes and also orders the ring closures of chiral atoms, which
+    SmilesTraversal leaves to whatever an earlier traversal stamped on
+    the bonds."""
+    atomLabel = staticmethod(tokens.atom_label)
+    bondSymbols = tokens.BOND_SYMBOLS
+    # note the traversal order of the bonds for the chirality
+    orderBonds = 0
+
+    def __init__(self):
+        self.atoms = []
+        self.bonds = []
+        # strings and the atoms whose labels go in their place
+        self.data = []
+        # atom -> [(closure bond, bond symbol or None)]
+        self.closures = {}
+        # bond -> its position among the bonds written
+        self.traverseOrder = {}
+
+    def addAtom(self, atom):
+        self.data.append(atom)
+        self.atoms.append(atom)
+
+    def addBond(self, bond):
+        self.data.append(self.bondSymbols[bond.bondtype])
+        self.bonds.append(bond)
+        if self.orderBonds:
+            self.traverseOrder[bond] = len(self.traverseOrder) + 1
+
+    def addClosure(self, atom1, atom2, bond):
+        closures = self.closures
+        # only the first atom writes the bond symbol
+        closures.setdefault(atom1, []).append(
+            (bond, self.bondSymbols[bond.bondtype]))
+        closures.setdefault(atom2, []).append((bond, None))
+        self.bonds.append(bond)
+        if self.orderBonds:
+            # the parser adds a closure bond to both atoms when it
+            # reads the second digit, which is written right here
+            self.traverseOrder[bond] = len(self.traverseOrder) + 1
+
+    def addBranch(self):
+        self.data.append("(")
+
+    def addBranchEnd(self):
+        self.data.append(")")
+
+    def __str__(self):
+        atomLabel = self.atomLabel
+        closures = self.closures
+        # closures are numbered in the order they are written
+        closureMappings = {}
+        text = []
+        for token in self.data:
+            if token.__class__ is str:
+                text.append(token)
+                continue
+            text.append(atomLabel(token))
+            if token in closures:
+                orderOfClosures = []
+                for bond, symbol in closures[token]:
+                    if not bond in closureMappings:
+                        closureMappings[bond] = len(closureMappings) + 1
+                    orderOfClosures.append((closureMappings[bond], symbol))
+                orderOfClosures.sort()
+                for id, symbol in orderOfClosures:
+                    if symbol: text.append(symbol)
+                    text.append(tokens.closure_label(id))
+        return "".join(text)
+
+class SmartsWriter(SmilesWriter):
+    atomLabel = staticmethod(tokens.smarts_atom_label)
+    bondSymbols = tokens.SMARTS_BOND_SYMBOLS
+
+class IsomericSmilesWriter(SmilesWriter):
+    orderBonds = 1
+
+    def atomLabel(self, atom):
+        return tokens.isomeric_atom_label(atom, self.traverseOrder)
@@ -56,6 +56,104 @@ There are for types of tokens
 # carbon by lower case c.
 ORGANIC_SUBSET = ['B', 'C', 'N', 'O', 'P', 'S', 'F', 'Cl', 'Br', 'I']
 
+# bond symbols by bondtype
+BOND_SYMBOLS = {
+    1:"",
+    2:"=",
+    3:"#",
+    4:"",
+    5:"\\",
+    6:"/"}
+
+SMARTS_BOND_SYMBOLS = {
+    1:"-",
+    2:"=",
+    3:"#",
+    4:":",
+    5:"\\",
+    6:"/"}
+
+def atom_label(atom, chirality=None, traverseOrder=None):
+    """(atom, chirality=None, traverseOrder=None)->the smiles label of
+    atom without its closures, chirality is the @ or @@ to write for a
+    chiral atom, see chiral_order() for traverseOrder"""
+    symbol = "%s"%(atom.symbol,)
+    weight = atom.weight
+    charge = atom.charge
+    hcount = atom.hcount
+    explicit_hcount = atom.explicit_hcount
+
+    if atom.aromatic:
+        out_symbol = symbol[0].lower() + symbol[1:]
+    else:
+        out_symbol = symbol
+
+    # pyrole like nitrogens
+    if atom.aromatic and symbol == "N" and charge == 0 and \
+       weight == 0 and explicit_hcount == 1:
+        # XXX Fix Me
+        # There should only be one of these per five membered
+        # aromatic ring
+        return "[nH]"
+
+    if symbol in ORGANIC_SUBSET and atom.valences and \
+       not weight and not charge and not chirality:
+        sumOrders = atom.sumBondOrders()
+        hcount = atom.hcount
+        for valence in atom.valences:
+            if sumOrders + hcount == valence:
+                return out_symbol#+"<%s>"%atom.handle
+
+    if not weight: weight = ""
+
+    if charge == -1: charge = "-"
+    elif charge == 1: charge = "+"
+    elif charge > 1: charge = "+%s"%charge
+    else: charge = ""
+
+    if hcount == 1: hcount = "H"
+    elif hcount == 0: hcount = ""
+    elif hcount > 1: hcount = "H%s"%hcount
+    else:
+        raise "Negative hcount!!!"
+
+    if chirality:
+        chiralstr = chirality.getChirality(chiral_order(atom,
+                                                        traverseOrder))
+    else:
+        chiralstr = ""
+    return "[%s%s%s%s%s]"%(weight, out_symbol, chiralstr, hcount, charge)
+
+def chiral_order(atom, traverseOrder=None):
+    """the neighbors of atom in the order their bonds were written,
+    traverseOrder maps the bonds to that order, by default it is their
+    _traverseOrder"""
+    if traverseOrder is None:
+        bonds = [(bond._traverseOrder, bond) for bond in atom.bonds]
+    else:
+        bonds = [(traverseOrder[bond], bond) for bond in atom.bonds]
+    bonds.sort()
+    return [bond[1].xatom(atom) for bond in bonds]
+
+def isomeric_atom_label(atom, traverseOrder=None):
+    return atom_label(atom, atom._chirality, traverseOrder)
+
+def smarts_atom_label(atom):
+    symbol = atom.symbol
+
+    if atom.aromatic:
+        symbol = symbol.lower()
+
+    if atom.symbol in ORGANIC_SUBSET:
+        return symbol
+    else:
+        return "[%s]"%symbol
+
+def closure_label(id):
+    if id > 9:
+        return "%%%s"%id
+    return "%s"%id
+
 class Atom:
     def __init__(self, atom, closureMappings, idGenerator):
         self.atom = atom
@@ -64,49 +162,8 @@ class Atom:
         self.idGenerator = idGenerator
 
     def name_atom(self):
-        atom = self.atom
-        symbol = "%s"%(atom.symbol,)
-        weight = atom.weight
-        charge = atom.charge
-        hcount = atom.hcount
-        explicit_hcount = atom.explicit_hcount
-        
-        if atom.aromatic:
-            out_symbol = symbol[0].lower() + symbol[1:]
-        else:
-            out_symbol = symbol
-
-        # pyrole like nitrogens
-        if atom.aromatic and symbol == "N" and charge == 0 and \
-           weight == 0 and explicit_hcount == 1:
-            # XXX Fix Me
-            # There should only be one of these per five membered
-            # aromatic ring
-            return "[nH]"
-
-        if symbol in ORGANIC_SUBSET and atom.valences and \
-           not weight and not charge:
-            sumOrders = atom.sumBondOrders()
-            hcount = atom.hcount
-            for valence in atom.valences:
-                if sumOrders + hcount == valence:
-                    return out_symbol#+"<%s>"%atom.handle
-
-        if not weight: weight = ""
-        
-        if charge == -1: charge = "-"
-        elif charge == 1: charge = "+"
-        elif charge > 1: charge = "+%s"%charge
-        else: charge = ""
-
-        if hcount == 1: hcount = "H"
-        elif hcount == 0: hcount = ""
-        elif hcount > 1: hcount = "H%s"%hcount
-        else:
-            raise "Negative hcount!!!"
-
-        return "[%s%s%s%s]"%(weight, out_symbol, hcount, charge)
-                    
+        return atom_label(self.atom)
+
     def __str__(self):
         # easy for now
         atom = self.atom
@@ -124,106 +181,29 @@ class Atom:
 
         for id, bond in orderOfClosures:
             if bond: label.append(str(bond))
-            if id > 9:
-                label.append("%%%s"%id)
-            else:
-                label.append("%s"%id)
+            label.append(closure_label(id))
         return "".join(label)
-#
-# XXX FIX ME -> a lot of shared code here, it would be nicer
-# if we can get rid of them
+
 class IsomericAtom(Atom):
     def name_atom(self):
-        atom = self.atom
-        symbol = "%s"%(atom.symbol,)
-        weight = atom.weight
-        charge = atom.charge
-        hcount = atom.hcount
-        explicit_hcount = atom.explicit_hcount
-        chirality = atom._chirality
-        
-        if atom.aromatic:
-            out_symbol = symbol[0].lower() + symbol[1:]
-        else:
-            out_symbol = symbol
-
-        # pyrole like nitrogens
-        if atom.aromatic and symbol == "N" and charge == 0 and \
-           weight == 0 and explicit_hcount == 1:
-            # XXX Fix Me
-            # There should only be one of these per five membered
-            # aromatic ring
-            return "[nH]"
-
-        if symbol in ORGANIC_SUBSET and atom.valences and \
-           not weight and not charge and not chirality:
-            sumOrders = atom.sumBondOrders()
-            hcount = atom.hcount
-            for valence in atom.valences:
-                if sumOrders + hcount == valence:
-                    return out_symbol#+"<%s>"%atom.handle
-
-        if not weight: weight = ""
-        
-        if charge == -1: charge = "-"
-        elif charge == 1: charge = "+"
-        elif charge > 1: charge = "+%s"%charge
-        else: charge = ""
-
-        if hcount == 1: hcount = "H"
-        elif hcount == 0: hcount = ""
-        elif hcount > 1: hcount = "H%s"%hcount
-        else:
-            raise "Negative hcount!!!"
-
-        if chirality:
-            bonds = [(bond._traverseOrder, bond) for bond in atom.bonds]
-            bonds.sort()
-            bonds = [bond[1].xatom(atom) for bond in bonds]
-            chiralstr = chirality.getChirality(bonds)
-        else:
-            chiralstr = ""
-        return "[%s%s%s%s%s]"%(weight, out_symbol, chiralstr, hcount, charge)
-        return "[%s%s%s%s<%s>]"%(weight, out_symbol, hcount, charge, atom.handle)
+        return isomeric_atom_label(self.atom)
     
 class SmartsAtom(Atom):
     def name_atom(self):
-        atom = self.atom
-        symbol = atom.symbol
-
-        if atom.aromatic:
-            symbol = symbol.lower()
-            
-        if atom.symbol in ORGANIC_SUBSET:
-            return symbol
-        else:
-            return "[%s]"%symbol
+        return smarts_atom_label(self.atom)
     
 
 class Bond:
+    lookup = BOND_SYMBOLS
+
     def __init__(self, bond):
         self.bond = bond
-        self.lookup = {
-            1:"",
-            2:"=",
-            3:"#",
-            4:"",
-            5:"\\",
-            6:"/"}
         
     def __str__(self):
         return self.lookup[self.bond.bondtype]    
 
 class SmartsBond(Bond):
-    def __init__(self, bond):
-        self.bond = bond
-        self.lookup = {
-            1:"-",
-            2:"=",
-            3:"#",
-            4:":",
-            5:"\\",
-            6:"/"}
+    lookup = SMARTS_BOND_SYMBOLS
         
 class Branch:       
     def __str__(self):
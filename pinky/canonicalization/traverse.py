@@ -36,7 +36,8 @@ representation.
 
 Each atom of a Molecule or Graph must have a attribute 'symorder' which
 is a unique number.  This number guarantees only one traversal for
-the graph.
+the graph.  draw(molecule, orders=...) takes these numbers from the
+orders dictionary instead, leaving the atoms untouched.
 
 Additionally each bond must have an attribute equiv_class which is
 a unique value for each different type of bond.  This guarantees
@@ -48,25 +49,26 @@ Advanced usage:
 canonical_string = Traverse.draw(molecule, TraversalType)
 
 TraversalType controls how the traversal is represented.
-SmilesTraversal is the default TraversalType but this can be
-subclassed for different representations.  For example it is
-easy to create a subclass to generate Tripos Line formats.
+SmilesWriter is the default TraversalType, it writes the smiles text
+directly.  SmilesTraversal gives the same text through token objects
+and can be subclassed for different representations.  For example it
+is easy to create a subclass to generate Tripos Line formats.
 """
 
-from .smiles import SmilesTraversal, SmartsTraversal,  IsomericSmilesTraversal
+from .smiles import SmilesWriter, SmartsWriter, IsomericSmilesWriter
 
-def _traverse(atom, traverse, prevAtom,
-              visitedAtoms, visitedBonds,
-              atoms, bonds, Traversal, bondIndex=0):
+def _visit(atom, traverse, prevAtom,
+           visitedAtoms, visitedBonds, atoms, bonds, orders):
+    """add atom and its ring closures to traverse and return the
+    (symorder, equiv_class, index, oatom, bond) of the neighbors left
+    to traverse to, in traversal order"""
     visitedAtoms[atom] = 1
     traverse.addAtom(atom)
     atoms.append(atom)
 
     bondsToTraverse = []
-    traversals = []
-    
-    for bond in atom.bonds:
-        oatom = bond.xatom(atom)
+    bondIndex = 0
+    for oatom, bond in zip(atom.oatoms, atom.bonds):
         if prevAtom is not None and oatom == prevAtom:
             # we are traversing back the way we came!
             # so don't...
@@ -77,72 +79,103 @@ def _traverse(atom, traverse, prevAtom,
             bonds.append(bond)
             visitedBonds[bond] = 1
         else:
-            bondsToTraverse.append((oatom.symorder,
+            bondsToTraverse.append((orders[oatom],
                                     bond.equiv_class,
                                     bondIndex,
                                     oatom,
                                     bond))
         bondIndex += 1
 
-    if not bondsToTraverse:
-        # dead end, return
-        return
-
     bondsToTraverse.sort()
-
-    for symorder, bondEclass, index, oatom, obond in bondsToTraverse:
-        if oatom in visitedAtoms:
+    return bondsToTraverse
+
+def _traverse(atom, traverse, visitedAtoms, visitedBonds, atoms, bonds,
+              orders):
+    """depth first traversal from atom writing every token into
+    traverse
+
+    Works with a stack instead of recursion so chains of any length
+    can be drawn.  Every branch but the last one of an atom is written
+    between a Branch and a BranchEnd token.  Whether a branch is the
+    last one is only known once it is done (its atoms may be all that
+    is left of the later branches), so the Branch token of the last
+    branch is removed afterwards."""
+    data = traverse.data
+    # [atom, neighbors left to traverse to, next neighbor, position
+    #  of the Branch token of the branch being traversed]
+    stack = [[atom, _visit(atom, traverse, None, visitedAtoms,
+                           visitedBonds, atoms, bonds, orders), 0, None]]
+    while stack:
+        frame = stack[-1]
+        atom, bondsToTraverse, index, branch = frame
+        while index < len(bondsToTraverse) and \
+              bondsToTraverse[index][3] in visitedAtoms:
             # somehow, we've seen this atom so skip it
+            index += 1
+
+        if index == len(bondsToTraverse):
+            # dead end, close the branch that led here
+            stack.pop()
+            if stack:
+                frame = stack[-1]
+                bondsToTraverse = frame[1]
+                for i in range(frame[2], len(bondsToTraverse)):
+                    if bondsToTraverse[i][3] not in visitedAtoms:
+                        traverse.addBranchEnd()
+                        break
+                else:
+                    data[frame[3]] = None
             continue
-        nextTraverse = Traversal(traverse)
-        traversals.append(nextTraverse)
-        nextTraverse.addBond(obond)
+
+        symorder, bondEclass, bondIndex, oatom, obond = bondsToTraverse[index]
+        frame[2] = index + 1
+        frame[3] = len(data)
+        traverse.addBranch()
+        traverse.addBond(obond)
         bonds.append(obond)
         visitedBonds[obond] = 1
+        stack.append([oatom, _visit(oatom, traverse, atom, visitedAtoms,
+                                    visitedBonds, atoms, bonds, orders),
+                      0, None])
 
-        _traverse(oatom, nextTraverse, atom,
-                  visitedAtoms, visitedBonds,
-                  atoms, bonds, Traversal, bondIndex)
-
-    for t in traversals[:-1]:
-        traverse.addBranch()
-        traverse.append(t)
-        traverse.addBranchEnd()
-        
-    for t in traversals[-1:]:
-        traverse.append(t)
+    data[:] = [token for token in data if token is not None]
 
-def _get_lowest_symorder(atoms):
+def _get_lowest_symorder(atoms, orders):
     best = atoms[0]
     for atom in atoms[1:]:
-        if atom.symorder < best.symorder:
+        if orders[atom] < orders[best]:
             best = atom
     return best
 
-def draw(molecule, TraversalType=SmilesTraversal):
-    """(molecule)->canonical representation of a molecule
+def draw(molecule, TraversalType=SmilesWriter, orders=None):
+    """(molecule, TraversalType=SmilesWriter, orders=None)->canonical
+    representation of a molecule
     Well, it's only canonical if the atom symorders are
     canonical, otherwise it's arbitrary.
 
-    atoms must have a symorder attribute
+    atoms must have a symorder attribute unless orders maps
+    every atom to the number to use instead
     bonds must have a equiv_class attribute"""
     result = []
     atoms = allAtoms = molecule.atoms
+    if orders is None:
+        orders = {}
+        for atom in atoms:
+            orders[atom] = atom.symorder
 
     visitedAtoms = {}
     #
     # Traverse all components of the graph to form
     # the output string
     while atoms:
-        atom = _get_lowest_symorder(atoms)
+        atom = _get_lowest_symorder(atoms, orders)
         visitedAtoms[atom] = 1
 
         visitedBonds = {}
         nextTraverse = TraversalType()
         atomsUsed, bondsUsed = [], []
-        _traverse(atom, nextTraverse, None,
-                  visitedAtoms, visitedBonds,
-                  atomsUsed, bondsUsed, TraversalType)
+        _traverse(atom, nextTraverse, visitedAtoms, visitedBonds,
+                  atomsUsed, bondsUsed, orders)
         atoms = []
         for atom in allAtoms:
             if not atom in visitedAtoms:
@@ -162,8 +195,8 @@ def draw(molecule, TraversalType=SmilesTraversal):
 
     return ".".join(fragments), result
 
-def drawSmarts(molecule):
-    return draw(molecule, TraversalType=SmartsTraversal)
+def drawSmarts(molecule, orders=None):
+    return draw(molecule, SmartsWriter, orders)
 
-def drawIsomeric(molecule):
-    return draw(molecule, TraversalType=IsomericSmilesTraversal)
+def drawIsomeric(molecule, orders=None):
+    return draw(molecule, IsomericSmilesWriter, orders)
@@ -0,0 +1,279 @@
+"""
+Find the unique structures of SMILES files larger than memory.
+
+    python -m pinky.dedup vendor1.smi vendor2.smi -o unique.smi -p 32
+
+The records are parsed and canonicalized on a pool of worker processes
+as in pinky.parallel.  Their keys, the canonical SMILES or the 128 bit
+Molecule.canonical_hash, are collected into runs of run_size records
+which are sorted and written to temporary files, and the runs are then
+merged, at most fan_in files at a time.  With the hash as key only the
+input SMILES go through the runs, the canonical SMILES are drawn once
+per unique structure after the merge.  Memory use depends on run_size,
+chunksize and processes, never on the size of the input.
+
+The output has one tab separated line per unique structure, in key
+order:
+
+    canonical smiles, number of records, id of every record
+
+The ids are in input order.  The id of a record is its name, or
+source:lineno when it has none, where source is the path of its file
+(or its position in sources).  Records that fail to parse or to
+canonicalize are counted and, with errors=path, listed there.
+
+    from pinky.dedup import dedup
+
+    stats = dedup(['vendor1.smi', 'vendor2.smi'], 'unique.smi')
+    print(stats.records, stats.failed, stats.unique)
+"""
+import argparse
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
+
+from .exceptions import SmilesRecordError
+from .parallel import _chunks, _imap
+from .smiles.parser import TRANSFORMS, _smilin_lines, smilin
+
+KEYS = ("smiles", "hash")
+
+Stats = namedtuple("Stats", ["records", "failed", "unique"])
+
+def _work(source, label, start, lines, key, ranking):
+    """Canonicalize one chunk of lines, runs in the workers
+
+    -> ([(key, source, lineno, id, smiles)], [(id, error)]), smiles
+    is the input SMILES with the hash as key and "" otherwise"""
+    records = []
+    failures = []
+    for lineno, name, mol in _smilin_lines(lines, TRANSFORMS, "yield", start):
+        if name is None:
+            name = "%s:%d" % (label, lineno)
+        else:
+            name = name.replace("\t", " ")
+        if isinstance(mol, SmilesRecordError):
+            failures.append((name, str(mol.error)))
+            continue
+        try:
+            if key == "hash":
+                digest = "%032x" % mol.canonical_hash(128)
+                line = lines[lineno - start]
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                smiles = line.split(None, 1)[0]
+                record = (digest, source, lineno, name, smiles)
+            else:
+                record = (mol.cansmiles(ranking=ranking), source, lineno,
+                          name, "")
+        except Exception as e:
+            failures.append((name, str(e)))
+            continue
+        records.append(record)
+    return records, failures
+
+def _draw(lines, ranking):
+    """canonical SMILES of the SMILES lines, runs in the workers"""
+    return [smilin(line[:-1]).cansmiles(ranking=ranking) for line in lines]
+
+def _tasks(sources, chunksize, key, ranking):
+    for source, lines in enumerate(sources):
+        if isinstance(lines, (str, os.PathLike)):
+            label = os.fspath(lines)
+            with open(lines, buffering=1 << 20) as fh:
+                for lineno, chunk in _chunks(fh, chunksize):
+                    yield source, label, lineno, chunk, key, ranking
+        else:
+            for lineno, chunk in _chunks(lines, chunksize):
+                yield source, str(source), lineno, chunk, key, ranking
+
+def _write_run(records, tmpdir):
+    """sort records into a new run file, -> its path"""
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with open(fd, "w", buffering=1 << 20) as fh:
+        for key, source, lineno, name, smiles in records:
+            fh.write("%s\t%d\t%d\t%s\t%s\n" % (key, source, lineno,
+                                               name, smiles))
+    return path
+
+def _read_run(path):
+    with open(path, buffering=1 << 20) as fh:
+        for line in fh:
+            key, source, lineno, name, smiles = line[:-1].split("\t")
+            yield key, int(source), int(lineno), name, smiles
+
+def _merge(paths, tmpdir, fan_in):
+    """-> iterator of the records of every run in order, the runs are
+    first merged fan_in at a time until there are at most fan_in"""
+    paths = list(paths)
+    while len(paths) > fan_in:
+        group, paths = paths[:fan_in], paths[fan_in:]
+        fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+        with open(fd, "w", buffering=1 << 20) as fh:
+            for record in heapq.merge(*map(_read_run, group)):
+                fh.write("%s\t%d\t%d\t%s\t%s\n" % record)
+        for old in group:
+            os.remove(old)
+        paths.append(path)
+    return heapq.merge(*map(_read_run, paths))
+
+def _write_unique(records, out, id_buffer, heads=None):
+    """write one line per key to out, -> number of keys
+
+    The ids of a key are kept in memory id_buffer at a time, the rest
+    wait in a temporary file until the count is known.  With heads the
+    lines start with the count and the SMILES of the first record of
+    every key are written to heads instead, one per line."""
+    unique = 0
+    for key, group in groupby(records, itemgetter(0)):
+        unique += 1
+        first = next(group)
+        if heads is None:
+            start = "%s\t" % (first[4] or key)
+        else:
+            heads.write(first[4] + "\n")
+            start = ""
+        ids = [first[3]]
+        count = 1
+        spill = None
+        for record in group:
+            count += 1
+            ids.append(record[3])
+            if len(ids) >= id_buffer:
+                if spill is None:
+                    spill = tempfile.TemporaryFile("w+")
+                spill.write("\t" + "\t".join(ids))
+                ids = []
+        out.write("%s%d" % (start, count))
+        if spill is not None:
+            spill.seek(0)
+            shutil.copyfileobj(spill, out)
+            spill.close()
+        if ids:
+            out.write("\t" + "\t".join(ids))
+        out.write("\n")
+    return unique
+
+def _add_smiles(groups, heads, out, ranking, processes, chunksize):
+    """write the lines of groups to out, each after the canonical SMILES
+    of the line of heads with the same number"""
+    tasks = ((chunk, ranking) for lineno, chunk in _chunks(heads, chunksize))
+    for chunk in _imap(_draw, tasks, processes):
+        for smiles in chunk:
+            out.write("%s\t%s" % (smiles, next(groups)))
+
+def dedup(sources, output, processes=None, chunksize=1000, key="smiles",
+          ranking="refine", run_size=1000000, fan_in=64, tmpdir=None,
+          errors=None, id_buffer=100000):
+    """Write the unique structures of sources to output.
+
+    :param sources: list of paths to .smi files or iterables of lines, see smilin_iter()
+    :param output: path or writable text file for the unique structures
+    :param processes: number of worker processes. Defaults to os.cpu_count(), 1 runs in this process.
+    :param chunksize: number of lines sent to a worker at a time.
+    :param key: "smiles" groups the records on their canonical SMILES, "hash" on their 128 bit canonical_hash.
+    :param ranking: ranking engine of the SMILES, "refine" or "freed", the hash always uses "refine".
+    :param run_size: number of records sorted in memory before they are written to a run.
+    :param fan_in: most runs merged at a time.
+    :param tmpdir: directory for the runs, defaults to the system temporary directory.
+    :param errors: path or writable text file for the id and error of every failed record.
+    :param id_buffer: most ids of one structure kept in memory at a time.
+    :rtype: Stats(records, failed, unique)
+    """
+    if key not in KEYS:
+        raise ValueError("key must be one of %s, not %r" % (KEYS, key))
+    if run_size < 1 or fan_in < 2 or id_buffer < 1:
+        raise ValueError("run_size and id_buffer must be >= 1 "
+                         "and fan_in >= 2")
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    opened = []
+    try:
+        if isinstance(output, (str, os.PathLike)):
+            output = open(output, "w", buffering=1 << 20)
+            opened.append(output)
+        if isinstance(errors, (str, os.PathLike)):
+            errors = open(errors, "w")
+            opened.append(errors)
+
+        with tempfile.TemporaryDirectory(dir=tmpdir) as workdir:
+            records = failed = 0
+            runs = []
+            run = []
+            tasks = _tasks(sources, chunksize, key, ranking)
+            for results, failures in _imap(_work, tasks, processes):
+                records += len(results) + len(failures)
+                failed += len(failures)
+                if errors is not None:
+                    for name, error in failures:
+                        errors.write("%s\t%s\n" % (name, error))
+                run.extend(results)
+                if len(run) >= run_size:
+                    runs.append(_write_run(run, workdir))
+                    run = []
+            if run:
+                runs.append(_write_run(run, workdir))
+            del run
+            merged = _merge(runs, workdir, fan_in)
+            if key == "hash":
+                with tempfile.TemporaryFile("w+", dir=workdir) as groups, \
+                     tempfile.TemporaryFile("w+", dir=workdir) as heads:
+                    unique = _write_unique(merged, groups, id_buffer, heads)
+                    groups.seek(0)
+                    heads.seek(0)
+                    _add_smiles(groups, heads, output, ranking, processes,
+                                chunksize)
+            else:
+                unique = _write_unique(merged, output, id_buffer)
+    finally:
+        for fh in opened:
+            fh.close()
+    return Stats(records, failed, unique)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pinky.dedup",
+        description="Write the unique structures of SMILES files, "
+                    "one per line with the number and ids of the "
+                    "records they came from.")
+    parser.add_argument("sources", nargs="+", metavar="FILE",
+                        help="SMILES file, - reads standard input")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file, default standard output")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes, default one per cpu")
+    parser.add_argument("-k", "--key", choices=KEYS, default="smiles",
+                        help="group on the canonical SMILES or hash")
+    parser.add_argument("--ranking", choices=("refine", "freed"),
+                        default="refine",
+                        help="ranking engine of the canonical SMILES")
+    parser.add_argument("--chunksize", type=int, default=1000,
+                        help="lines sent to a worker at a time")
+    parser.add_argument("--run-size", type=int, default=1000000,
+                        help="records sorted in memory per run")
+    parser.add_argument("--fan-in", type=int, default=64,
+                        help="most runs merged at a time")
+    parser.add_argument("--tmpdir", default=None,
+                        help="directory for the sorted runs")
+    parser.add_argument("--errors", default=None,
+                        help="file listing the records that failed")
+    args = parser.parse_args(argv)
+
+    sources = [sys.stdin if path == "-" else path for path in args.sources]
+    output = sys.stdout if args.output == "-" else args.output
+    stats = dedup(sources, output, processes=args.processes,
+                  chunksize=args.chunksize, key=args.key,
+                  ranking=args.ranking, run_size=args.run_size,
+                  fan_in=args.fan_in, tmpdir=args.tmpdir,
+                  errors=args.errors)
+    sys.stderr.write("%d records, %d failed, %d unique\n" % stats)
+
+if __name__ == "__main__":
+    main()
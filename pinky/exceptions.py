@@ -2,3 +2,19 @@
 class PinkyError(Exception):
     """Base exception class"""
     pass
+
+class SmilesRecordError(PinkyError):
+    """A single record of a batch of SMILES could not be parsed"""
+    def __init__(self, error, smiles, name=None, lineno=None):
+        self.error = error
+        self.smiles = smiles
+        self.name = name
+        self.lineno = lineno
+        super().__init__("line {}: {!r}: {}".format(lineno, smiles, error))
+
+class TooComplexError(PinkyError):
+    """A molecule needs more work than a budget allows, see pinky.budget"""
+    def __init__(self, budget, limit):
+        self.budget = budget
+        self.limit = limit
+        super().__init__("too complex: more than {} {}".format(limit, budget))
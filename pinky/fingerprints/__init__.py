@@ -1 +1 @@
-from pinky.fingerprints.ecfp import ecfp
+from pinky.fingerprints.ecfp import ecfp, ecfp_bits, ecfp_array, ecfp_counts, hash32, hash64
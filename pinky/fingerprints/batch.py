@@ -0,0 +1,265 @@
+"""
+Extended-Connectivity fingerprints for many molecules at once.
+
+The molecules are flattened into one set of arrays: per atom invariants
+and a CSR adjacency list (for atom i, the directed edges
+indptr[i]:indptr[i+1]).  Each ECFP iteration is then run for the whole
+batch as NumPy gathers, a segmented sort of the neighbor identifiers and
+a vectorized hash_combine.  Neighborhoods are bond bitsets packed into
+uint64 words and duplicates are found with one sort per layer.
+
+The identifiers are the same as those of
+ecfp(mol, radius, hashfunc=hash32) (or hash64), only the stable hashes
+can be vectorized.
+
+Requires NumPy.
+"""
+import numpy as np
+
+from .ecfp import hash32, hash64
+
+M32 = np.uint64(0xffffffff)
+C32 = np.uint64(0x9e3779b9)
+C64 = np.uint64(0x9e3779b97f4a7c15)
+SIX = np.uint64(6)
+TWO = np.uint64(2)
+
+def _combine32(seed, v):
+    seed ^= (v & M32) + C32 + (seed << SIX) + (seed >> TWO)
+    seed &= M32
+    return seed
+
+def _combine64(seed, v):
+    seed ^= v + C64 + (seed << SIX) + (seed >> TWO)
+    return seed
+
+def _mix(h, v):
+    """splitmix64 finalizer of h ^ v, a better mixer than hash_combine
+    for the sparse bitset rows in _first_rows"""
+    h = h ^ v
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xbf58476d1ce4e5b9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94d049bb133111eb)
+    h ^= h >> np.uint64(31)
+    return h
+
+def _ints(values):
+    """list of python ints -> uint64 array (two's complement for negatives)"""
+    return np.array(values, dtype=np.int64).view(np.uint64)
+
+class _Batch:
+    """A list of molecules flattened into arrays, neighborhoods are
+    stored in words uint64 words per atom"""
+    def __init__(self, mols, words):
+        number, degree, hcount, charge, mass, ring = [], [], [], [], [], []
+        atom_mol = []
+        indptr = [0]
+        neighbor, bondtype, bond = [], [], []
+        offset = 0
+        for m, mol in enumerate(mols):
+            atoms = mol.atoms
+            number.extend([a.number for a in atoms])
+            degree.extend([len(a.oatoms) for a in atoms])
+            hcount.extend([a.hcount for a in atoms])
+            charge.extend([a.charge for a in atoms])
+            mass.extend([a.mass for a in atoms])
+            ring.extend([len(a.rings) > 0 for a in atoms])
+            atom_mol.extend([m] * len(atoms))
+            for a in atoms:
+                for oatom, b in zip(a.oatoms, a.bonds):
+                    neighbor.append(offset + oatom.index)
+                    bondtype.append(b.bondtype)
+                    bond.append(b.index)
+                indptr.append(len(neighbor))
+            offset += len(atoms)
+
+        self.nmols = len(mols)
+        self.natoms = offset
+        self.number = _ints(number)
+        self.degree = _ints(degree)
+        self.hcount = _ints(hcount)
+        self.charge = _ints(charge)
+        self.mass = np.array(mass, dtype=np.float64).view(np.uint64)
+        self.ring = np.array(ring, dtype=bool)
+        self.atom_mol = np.array(atom_mol, dtype=np.int64)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.neighbor = np.array(neighbor, dtype=np.int64)
+        self.bondtype = _ints(bondtype)
+
+        # owner of each directed edge
+        self.owner = np.repeat(np.arange(offset, dtype=np.int64),
+                               np.diff(self.indptr))
+
+        # the bond of each edge as a row of bits
+        bond = np.array(bond, dtype=np.int64)
+        self.words = words
+        self.edge_bits = np.zeros((len(bond), words), dtype=np.uint64)
+        self.edge_bits[np.arange(len(bond)), bond >> 6] = \
+            np.left_shift(np.uint64(1), (bond & 63).astype(np.uint64))
+
+def _first_rows(rows):
+    """rows -> for each row, the index of the first row equal to it"""
+    # sort on a hash of the rows and check that rows with equal
+    # hashes really are equal, on a collision do it the slow way
+    h = np.zeros(len(rows), dtype=np.uint64)
+    for column in rows.T:
+        h = _mix(h, column)
+    order = np.argsort(h, kind='stable')
+    h = h[order]
+    rows = rows[order]
+    same = h[1:] == h[:-1]
+    if (same & (rows[1:] != rows[:-1]).any(axis=1)).any():
+        _, first, inverse = np.unique(rows, axis=0, return_index=True,
+                                      return_inverse=True)
+        result = np.empty(len(rows), dtype=np.int64)
+        result[order] = order[first[inverse.reshape(-1)]]
+        return result
+
+    start = np.ones(len(rows), dtype=bool)
+    start[1:] = ~same
+    group = np.cumsum(start) - 1
+    result = np.empty(len(rows), dtype=np.int64)
+    result[order] = order[np.flatnonzero(start)][group]
+    return result
+
+def _identifiers(batch, radius, combine):
+    """batch -> (molecule index, identifier) arrays of every identifier
+    added to the fingerprints, see ecfp.identifiers"""
+    n = batch.natoms
+    zero = np.zeros(n, dtype=np.uint64)
+
+    # initial atom identifiers, see ecfp.invariants
+    ids = combine(zero.copy(), batch.number)
+    ids = combine(ids, batch.degree)
+    ids = combine(ids, batch.hcount)
+    ids = combine(ids, batch.charge)
+    mass = batch.mass
+    if combine is _combine32:
+        mass = mass ^ (mass >> np.uint64(32))
+    ids = combine(ids, mass)
+    ring = batch.ring
+    ids[ring] = combine(ids[ring], np.uint64(1))
+
+    found_mols = [batch.atom_mol]
+    found_ids = [ids]
+
+    indptr = batch.indptr
+    degree = np.diff(indptr)
+    owner = batch.owner
+    neighbor = batch.neighbor
+    bondtype = batch.bondtype
+    # atoms with at least k+1 neighbors, for each k
+    by_degree = [np.flatnonzero(degree > k) for k in range(degree.max(initial=0))]
+    starts = indptr[:-1][degree > 0]
+
+    nbhds = np.zeros((n, batch.words), dtype=np.uint64)
+    live = np.ones(n, dtype=bool)
+    seen = np.zeros((0, batch.words + 1), dtype=np.uint64)
+    mol_column = batch.atom_mol.astype(np.uint64)[:, None]
+
+    for layer in range(1, radius+1):
+        # sort each atom's edges by (bondtype, neighbor identifier)
+        nids = ids[neighbor]
+        order = np.lexsort((nids, bondtype, owner))
+        sorted_bt = bondtype[order]
+        sorted_ids = nids[order]
+
+        # hash [layer, id, bondtype1, id1, bondtype2, id2, ...]
+        round_ids = combine(zero.copy(), np.full(n, layer, dtype=np.uint64))
+        round_ids = combine(round_ids, ids)
+        for k, atoms in enumerate(by_degree):
+            edge = indptr[atoms] + k
+            seed = round_ids[atoms]
+            seed = combine(seed, sorted_bt[edge])
+            round_ids[atoms] = combine(seed, sorted_ids[edge])
+
+        # grow the neighborhoods by one bond
+        round_nbhds = nbhds.copy()
+        if len(starts):
+            grown = np.bitwise_or.reduceat(nbhds[neighbor] | batch.edge_bits,
+                                           starts, axis=0)
+            round_nbhds[degree > 0] |= grown
+
+        # dead atoms keep their identifier and neighborhood
+        round_ids[~live] = ids[~live]
+        round_nbhds[~live] = nbhds[~live]
+
+        # a live atom adds its identifier unless the same neighborhood
+        # was seen in an earlier layer or at a lower atom in this one
+        atoms = np.flatnonzero(live)
+        keys = np.hstack((mol_column[atoms], round_nbhds[atoms]))
+        everything = np.vstack((seen, keys))
+        position = np.arange(len(seen), len(everything))
+        new = _first_rows(everything)[len(seen):] == position
+
+        found_mols.append(batch.atom_mol[atoms[new]])
+        found_ids.append(round_ids[atoms[new]])
+        live[atoms[~new]] = False
+        seen = np.vstack((seen, keys[new]))
+
+        ids = round_ids
+        nbhds = round_nbhds
+
+    return np.concatenate(found_mols), np.concatenate(found_ids)
+
+def ecfp_batch(mols, radius=2, nbits=None, hashfunc=hash32, dense=False):
+    """Compute the Extended-Connectivity fingerprints of a list of molecules.
+
+    :param mols: list of molecule objects parsed from SMILES strings
+    :param radius: The number of iterations to perform. Defaults to 2 which is equivilent to ECFP4.
+    :param nbits: fold the identifiers to nbits columns (identifier % nbits).
+    :param hashfunc: hash32 or hash64, see ecfp()
+    :param dense: return a dense (len(mols), nbits) count matrix, requires nbits.
+    :rtype: CSR arrays (indptr, indices, counts) where row i holds the sorted identifiers (or folded columns) of mols[i] and their counts. With scipy, csr_matrix((counts, indices, indptr), shape=(len(mols), nbits)) builds the folded sparse matrix.
+    """
+    if hashfunc is hash32:
+        combine = _combine32
+    elif hashfunc is hash64:
+        combine = _combine64
+    else:
+        raise ValueError("ecfp_batch only supports hash32 and hash64")
+    if dense and not nbits:
+        raise ValueError("dense output needs nbits")
+
+    # molecules are grouped by the number of words needed for their
+    # neighborhood bitsets so one large molecule doesn't widen them all
+    groups = {}
+    for i, mol in enumerate(mols):
+        words = 1
+        while words * 64 < len(mol.bonds):
+            words *= 2
+        groups.setdefault(words, []).append(i)
+
+    found_mols, found_ids = [], []
+    for words, index in sorted(groups.items()):
+        batch = _Batch([mols[i] for i in index], words)
+        mol_index, identifiers = _identifiers(batch, radius, combine)
+        found_mols.append(np.array(index, dtype=np.int64)[mol_index])
+        found_ids.append(identifiers)
+    nmols = len(mols)
+    mol_index = np.concatenate(found_mols or [np.zeros(0, dtype=np.int64)])
+    identifiers = np.concatenate(found_ids or [np.zeros(0, dtype=np.uint64)])
+    if nbits:
+        identifiers = identifiers % np.uint64(nbits)
+
+    if dense:
+        counts = np.zeros((nmols, nbits), dtype=np.uint32)
+        np.add.at(counts, (mol_index, identifiers.astype(np.int64)), 1)
+        return counts
+
+    order = np.lexsort((identifiers, mol_index))
+    mol_index = mol_index[order]
+    identifiers = identifiers[order]
+    boundary = np.ones(len(order), dtype=bool)
+    boundary[1:] = (mol_index[1:] != mol_index[:-1]) | \
+                   (identifiers[1:] != identifiers[:-1])
+    first = np.flatnonzero(boundary)
+    counts = np.diff(np.append(first, len(order))).astype(np.uint32)
+    indices = identifiers[first]
+    if nbits:
+        indices = indices.astype(np.int64)
+    indptr = np.zeros(nmols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(mol_index[first], minlength=nmols),
+              out=indptr[1:])
+    return indptr, indices, counts
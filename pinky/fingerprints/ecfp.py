@@ -5,12 +5,43 @@ This is based on the MorganFingerprints.cpp code from rdkit:
   https://github.com/rdkit/rdkit/blob/master/Code/GraphMol/Fingerprints/MorganFingerprints.cpp
 """
 from bitarray import bitarray
-import copy
+import struct
 
 def gen_hash(lst):
     return hash(tuple(lst))
 
-def invariants(mol):
+def _float_bits(x):
+    """IEEE 754 bit pattern of a float as an integer"""
+    return struct.unpack('<Q', struct.pack('<d', x))[0]
+
+def hash32(lst):
+    """Stable 32 bit hash of a list of numbers.
+
+    Combines the values with boost's hash_combine (as rdkit does) so,
+    unlike gen_hash, the result does not depend on the interpreter,
+    platform or PYTHONHASHSEED.
+    """
+    seed = 0
+    for v in lst:
+        if v.__class__ is float:
+            v = _float_bits(v)
+            v ^= v >> 32
+        seed ^= (v & 0xffffffff) + 0x9e3779b9 + (seed << 6) + (seed >> 2)
+        seed &= 0xffffffff
+    return seed
+
+def hash64(lst):
+    """Stable 64 bit hash of a list of numbers, see hash32"""
+    seed = 0
+    for v in lst:
+        if v.__class__ is float:
+            v = _float_bits(v)
+        seed ^= ((v & 0xffffffffffffffff) + 0x9e3779b97f4a7c15 +
+                 (seed << 6) + (seed >> 2))
+        seed &= 0xffffffffffffffff
+    return seed
+
+def invariants(mol, hashfunc=gen_hash):
     """Generate initial atom identifiers using atomic invariants"""
     atom_ids = {}
     for a in mol.atoms:
@@ -23,60 +54,135 @@ def invariants(mol):
         if len(a.rings) > 0:
             components.append(1)
 
-        atom_ids[a.index] = gen_hash(components)
+        atom_ids[a.index] = hashfunc(components)
 
     return atom_ids
 
-def ecfp(mol, radius=2):
+def identifiers(mol, radius=2, hashfunc=gen_hash):
+    """Generate the atom identifiers of the Extended-Connectivity fingerprint.
+
+    Yields every identifier that is added to the fingerprint, as soon as
+    it is found, so a fingerprint can be built up without an intermediate
+    dictionary. Takes the same arguments as ecfp().
+    """
+
+    atom_ids = invariants(mol, hashfunc)
+    yield from atom_ids.values()
+
+    atoms = mol.atoms
+    natoms = len(atoms)
+    ids = [atom_ids[a.index] for a in atoms]
+
+    # (bondtype, bond index, neighbor index) for each atom
+    neighbors = []
+    for a in atoms:
+        neighbors.append([(b.bondtype, b.index, oatom.index)
+                          for oatom, b in zip(a.oatoms, a.bonds)])
+
+    # The neighborhood of an atom is the frozenset of the indices of the
+    # bonds it covers. Neighborhoods seen in any layer so far are kept in
+    # a set so duplicate environments are found with a single lookup.
+    # Each layer reads from one pair of buffers and writes the other,
+    # the two are swapped at the end of the layer.
+    neighborhoods = set()
+    atom_neighborhoods = [frozenset()] * natoms
+    round_neighborhoods = [frozenset()] * natoms
+    round_ids = [0] * natoms
+    dead_atoms = [False] * natoms
+
+    for layer in range(1, radius+1):
+        neighborhoods_this_round = []
+
+        for i in range(natoms):
+            if dead_atoms[i]:
+                # dead atoms keep their last identifier and neighborhood
+                round_ids[i] = ids[i]
+                round_neighborhoods[i] = atom_neighborhoods[i]
+                continue
+
+            nbhd = set(atom_neighborhoods[i])
+            nbsr = []
+            for bondtype, bidx, oidx in neighbors[i]:
+                nbhd.add(bidx)
+                nbhd |= atom_neighborhoods[oidx]
+                nbsr.append((bondtype, ids[oidx]))
+
+            nbsr.sort()
+            key = [layer, ids[i]]
+            for item in nbsr:
+                key.extend(item)
+
+            round_ids[i] = hashfunc(key)
+            nbhd = frozenset(nbhd)
+            round_neighborhoods[i] = nbhd
+            neighborhoods_this_round.append((nbhd, round_ids[i], i))
+
+        for nbhd, identifier, i in neighborhoods_this_round:
+            if nbhd not in neighborhoods:
+                yield identifier
+                neighborhoods.add(nbhd)
+            else:
+                dead_atoms[i] = True
+
+        ids, round_ids = round_ids, ids
+        atom_neighborhoods, round_neighborhoods = \
+            round_neighborhoods, atom_neighborhoods
+
+def ecfp(mol, radius=2, hashfunc=gen_hash):
     """Compute the Extended-Connectivity fingerprint for a molecule.
     
     :param mol: molecule object parsed from SMILES string
     :param radius: The number of iterations to perform. Defaults to 2 which is equivilent to ECFP4.
+    :param hashfunc: Function used to hash atom identifiers. Defaults to gen_hash (Python's builtin hash), use hash32 or hash64 for identifiers that are stable across processes and machines.
     :rtype: dictionary representing the molecular fingprint (atom identifiers and their counts).
     """
-
-    atom_ids = invariants(mol)
-
     fp = {}
-    for i in atom_ids.values():
+    for i in identifiers(mol, radius, hashfunc):
         fp[i] = fp.get(i, 0) + 1
+    return fp
 
-    neighborhoods = []
-    atom_neighborhoods = [ len(mol.bonds) * bitarray('0') for a in mol.atoms]
-    dead_atoms = len(mol.atoms) * bitarray('0')
-
-    for layer in range(1, radius+1):
-        round_ids = {}
-        round_atom_neighborhoods = copy.deepcopy(atom_neighborhoods)
-        neighborhoods_this_round = []
+def ecfp_bits(mol, radius=2, nbits=2048, hashfunc=gen_hash):
+    """Compute the Extended-Connectivity fingerprint folded to nbits bits.
 
-        for a in mol.atoms:
-            if dead_atoms[a.index]: continue
+    Identifiers are folded (identifier % nbits) as they are generated.
+    
+    :param nbits: Length of the fingerprint, must be a multiple of 8. Defaults to 2048.
+    :rtype: little endian bitarray of length nbits, bit i of byte j is bit 8*j+i of the fingerprint.
+    """
+    if nbits <= 0 or nbits % 8:
+        raise ValueError("nbits must be a positive multiple of 8")
+    bits = bitarray(nbits, endian='little')
+    bits.setall(0)
+    for i in identifiers(mol, radius, hashfunc):
+        bits[i % nbits] = 1
+    return bits
+
+def ecfp_array(mol, radius=2, nbits=2048, hashfunc=gen_hash, dtype='uint8'):
+    """Compute the folded Extended-Connectivity fingerprint as a packed NumPy array.
+
+    :param nbits: Length of the fingerprint, must be a multiple of the bits in dtype.
+    :param dtype: 'uint8' or 'uint64' words, bit k of the fingerprint is bit k % w of word k // w (w bits per word).
+    :rtype: NumPy array of nbits // w words sharing memory with the ecfp_bits() bitarray.
+    """
+    np = _numpy()
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if nbits % (8 * dtype.itemsize):
+        raise ValueError("nbits must be a multiple of %d" % (8 * dtype.itemsize))
+    return np.frombuffer(ecfp_bits(mol, radius, nbits, hashfunc), dtype=dtype)
 
-            nbsr = []
-            for b in a.bonds:
-                round_atom_neighborhoods[a.index][b.index] = True
-                oidx = b.xatom(a).index
-                round_atom_neighborhoods[a.index] |= atom_neighborhoods[oidx]
-                nbsr.append((b.bondtype, atom_ids[oidx]))
-
-            nbsr = sorted(nbsr)
-            nbsr = [item for sublist in nbsr for item in sublist]
-            nbsr.insert(0, atom_ids[a.index])
-            nbsr.insert(0, layer)
-
-            round_ids[a.index] = gen_hash(nbsr)
-            neighborhoods_this_round.append(
-                (round_atom_neighborhoods[a.index], round_ids[a.index], a.index)
-            )
-
-        for lst in neighborhoods_this_round:
-            if lst[0] not in neighborhoods:
-                fp[lst[1]] = fp.get(lst[1], 0) + 1
-                neighborhoods.append(lst[0])
-            else:
-                dead_atoms[lst[2]] = True
+def ecfp_counts(mol, radius=2, nbits=2048, hashfunc=gen_hash, dtype='uint32'):
+    """Compute the Extended-Connectivity count fingerprint folded to nbits.
 
-        atom_ids = round_ids
-        atom_neighborhoods = copy.deepcopy(round_atom_neighborhoods)
-    return fp
+    :rtype: NumPy array of length nbits, element i is the number of identifiers that fold to i.
+    """
+    np = _numpy()
+    folded = [i % nbits for i in identifiers(mol, radius, hashfunc)]
+    return np.bincount(folded, minlength=nbits).astype(dtype)
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required for array fingerprints, "
+                          "install pinky[numpy]")
+    return numpy
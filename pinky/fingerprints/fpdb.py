@@ -0,0 +1,250 @@
+"""
+Memory mapped files of folded fingerprints.
+
+A fingerprint database is written once with FingerprintWriter and then
+opened with FingerprintDB, which mmaps the file read only.  Nothing is
+parsed or copied on open: the rows, the popcount index and the string
+table are NumPy views of the mapping, so opening a file of any size
+takes milliseconds and every process that opens the same file shares
+the one copy in the page cache.
+
+    from pinky.fingerprints.fpdb import FingerprintWriter, FingerprintDB
+
+    with FingerprintWriter('library.fpdb', nbits=2048) as writer:
+        for rec in fingerprints('library.smi', nbits=2048, canonical=True):
+            if not rec.error:
+                writer.add(rec.fp, rec.name, rec.cansmiles)
+
+    with FingerprintDB('library.fpdb') as db:
+        rows, scores = db.index().threshold(ecfp_bits(query), 0.7)
+        names = [db.name(i) for i in rows]
+
+File layout, all integers little endian and every section starting on a
+64 byte boundary:
+
+    header   magic b'PINKYFP\\0', version (u32), nbits (u32), count (u64),
+             then the offsets of the four sections below (u64 each)
+    index    nbits + 2 u64, rows with popcount p are index[p]:index[p+1]
+    rows     count rows of nbits // 64 u64 words, sorted by popcount
+    table    2 * count + 1 u64 offsets into strings, row i has name
+             strings[table[2i]:table[2i+1]] and SMILES
+             strings[table[2i+1]:table[2i+2]]
+    strings  the UTF-8 names and SMILES
+
+Requires NumPy.
+"""
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+import numpy as np
+
+from .similarity import SimilarityIndex, _popcount
+
+MAGIC = b"PINKYFP\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQQ")
+ALIGN = 64
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+def _row(fp, words):
+    """bitarray or packed array -> bytes of one little endian row"""
+    if isinstance(fp, np.ndarray):
+        data = np.ascontiguousarray(fp).tobytes()
+    else:
+        data = bytes(fp)
+    if len(data) != 8 * words:
+        raise ValueError("fingerprint has %d bits, expected %d" % (
+            8 * len(data), 64 * words))
+    return data
+
+class FingerprintWriter:
+    """FingerprintWriter(path, nbits=2048)
+
+    Collects fingerprints in temporary files next to path and writes the
+    sorted database on close().  path only appears once it is complete.
+    nbits must be a multiple of 64.
+    """
+    def __init__(self, path, nbits=2048, block=1 << 16):
+        if nbits <= 0 or nbits % 64:
+            raise ValueError("nbits must be a positive multiple of 64")
+        self.path = path
+        self.nbits = nbits
+        self.words = nbits // 64
+        self.block = block
+        self.count = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        self._rows = tempfile.TemporaryFile(dir=directory)
+        self._strings = tempfile.TemporaryFile(dir=directory)
+        # end of the name and of the SMILES of each record in _strings
+        self._ends = array("Q")
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, fp, name="", smiles=""):
+        """Add one folded fingerprint (an ecfp_bits() bitarray or a packed
+        uint8/uint64 array) with its name and SMILES"""
+        self._rows.write(_row(fp, self.words))
+        for text in (name or "", smiles or ""):
+            data = text.encode("utf-8")
+            self._strings.write(data)
+            self._size += len(data)
+            self._ends.append(self._size)
+        self.count += 1
+
+    def abort(self):
+        """Discard everything added so far"""
+        self._rows.close()
+        self._strings.close()
+
+    def close(self):
+        """Sort the rows by popcount and write the database"""
+        self._rows.flush()
+        self._strings.flush()
+        rows = self._map(self._rows, self.count * self.words * 8)
+        rows = rows.view("<u8").reshape(self.count, self.words)
+        counts = np.empty(self.count, dtype=np.int64)
+        for lo in range(0, self.count, self.block):
+            counts[lo:lo + self.block] = _popcount(rows[lo:lo + self.block])
+        order = np.argsort(counts, kind="stable")
+        index = np.zeros(self.nbits + 2, dtype="<u8")
+        np.cumsum(np.bincount(counts, minlength=self.nbits + 1),
+                  out=index[1:])
+
+        ends = np.frombuffer(self._ends, dtype=np.uint64)
+        starts = np.zeros_like(ends)
+        starts[1:] = ends[:-1]
+        ends = ends.reshape(-1, 2)
+        starts = starts.reshape(-1, 2)
+        lengths = (ends - starts)[order]
+        table = np.zeros(2 * self.count + 1, dtype="<u8")
+        np.cumsum(lengths.reshape(-1), out=table[1:])
+        strings = self._map(self._strings, self._size)
+
+        index_offset = _aligned(HEADER.size)
+        rows_offset = _aligned(index_offset + index.nbytes)
+        table_offset = _aligned(rows_offset + rows.nbytes)
+        strings_offset = _aligned(table_offset + table.nbytes)
+
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                fh.write(HEADER.pack(MAGIC, VERSION, self.nbits, self.count,
+                                     index_offset, rows_offset, table_offset,
+                                     strings_offset))
+                fh.seek(index_offset)
+                fh.write(index.tobytes())
+                fh.seek(rows_offset)
+                for lo in range(0, self.count, self.block):
+                    fh.write(rows[order[lo:lo + self.block]].tobytes())
+                fh.seek(table_offset)
+                fh.write(table.tobytes())
+                fh.seek(strings_offset)
+                for i in order.tolist():
+                    fh.write(strings[int(starts[i, 0]):int(ends[i, 1])])
+                # an empty last section still has to be inside the file
+                fh.truncate()
+            del rows, strings
+            os.replace(tmp, self.path)
+        except BaseException:
+            # leave nothing half written behind
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            self.abort()
+
+    @staticmethod
+    def _map(fh, size):
+        if size == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.frombuffer(mmap.mmap(fh.fileno(), size,
+                                       access=mmap.ACCESS_READ),
+                             dtype=np.uint8)
+
+class FingerprintDB:
+    """FingerprintDB(path)
+
+    A read only, memory mapped fingerprint database.  fps is the
+    (count, nbits // 64) uint64 array of rows sorted by popcount and
+    popcount_index holds the first row of each popcount.  Row numbers
+    are the same everywhere: in fps, name(), smiles() and the results
+    of index() queries.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size or \
+           self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError("%s is not a fingerprint database" % path)
+        (magic, version, self.nbits, self.count, index_offset, rows_offset,
+         table_offset, strings_offset) = HEADER.unpack_from(self._map)
+        if version != VERSION:
+            self._map.close()
+            raise ValueError("%s has unsupported version %d" % (path, version))
+
+        words = self.nbits // 64
+        self.popcount_index = np.frombuffer(self._map, dtype="<u8",
+                                            count=self.nbits + 2,
+                                            offset=index_offset)
+        self.fps = np.frombuffer(self._map, dtype="<u8",
+                                 count=self.count * words,
+                                 offset=rows_offset).reshape(self.count, words)
+        self._table = np.frombuffer(self._map, dtype="<u8",
+                                    count=2 * self.count + 1,
+                                    offset=table_offset)
+        self._strings_offset = strings_offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """Drop the views of the file.  The mapping itself goes away with
+        the last array still referring to it."""
+        self.fps = self.popcount_index = self._table = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    def _string(self, i):
+        start = self._strings_offset + int(self._table[i])
+        end = self._strings_offset + int(self._table[i + 1])
+        return self._map[start:end].decode("utf-8")
+
+    def name(self, row):
+        """name of row"""
+        return self._string(2 * row)
+
+    def smiles(self, row):
+        """SMILES of row"""
+        return self._string(2 * row + 1)
+
+    def counts(self):
+        """popcount of each row, expanded from popcount_index"""
+        return np.repeat(np.arange(self.nbits + 1, dtype=np.int32),
+                         np.diff(self.popcount_index).astype(np.int64))
+
+    def index(self, **kwargs):
+        """SimilarityIndex over the rows of the file, without a copy"""
+        return SimilarityIndex(self.fps, counts=self.counts(), **kwargs)
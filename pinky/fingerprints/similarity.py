@@ -0,0 +1,179 @@
+"""
+Tanimoto similarity search over folded fingerprints.
+
+SimilarityIndex holds a matrix of fingerprints packed into uint64 words
+(one row per fingerprint, see ecfp_array(..., dtype='uint64')).  The
+rows are kept sorted by popcount so a query only looks at the rows that
+can reach the threshold: the Tanimoto similarity of fingerprints with
+popcounts a and b is at most min(a, b) / max(a, b) (Swamidass and Baldi
+2007, the BitBound of Hussain et al. 2020).
+
+    from pinky.fingerprints.similarity import SimilarityIndex
+
+    index = SimilarityIndex.from_bits([ecfp_bits(mol) for mol in mols])
+    rows, scores = index.threshold(ecfp_bits(query), 0.7)
+    rows, scores = index.topk(ecfp_bits(query), 10)
+
+Requires NumPy.
+"""
+import numpy as np
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(words, dtype=np.int64):
+        """popcount of each row of a 2-d uint64 array"""
+        return np.bitwise_count(words).sum(axis=1, dtype=dtype)
+else:
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)],
+                          dtype=np.int64)
+
+    def _popcount(words, dtype=np.int64):
+        """popcount of each row of a 2-d uint64 array"""
+        return _POPCOUNT8[words.view(np.uint8)].sum(axis=1, dtype=dtype)
+
+class SimilarityIndex:
+    """SimilarityIndex(fps, counts=None)
+
+    fps is an (n, words) uint64 array of packed fingerprints.  If its
+    rows are already sorted by popcount it is used as is (no copy, so
+    it may be a view of a memory mapped file), otherwise a sorted copy
+    is made.  Query results are always indices into the original fps.
+    counts, the popcount of each row, is computed when not given.
+    """
+    def __init__(self, fps, counts=None, block=1 << 16):
+        fps = np.asarray(fps)
+        if fps.ndim != 2 or fps.dtype != np.uint64:
+            raise ValueError("fps must be a 2-d uint64 array")
+        if counts is None:
+            counts = _popcount(fps)
+        elif len(counts) != len(fps):
+            raise ValueError("counts must have one popcount per row")
+        if np.all(counts[1:] >= counts[:-1]):
+            self.order = None
+        else:
+            self.order = np.argsort(counts, kind="stable")
+            fps = fps[self.order]
+            counts = counts[self.order]
+
+        self.fps = fps
+        self.counts = counts
+        self.block = block
+
+        # rows with the same popcount are contiguous
+        self.values, self.starts = np.unique(counts, return_index=True)
+        self.ends = np.append(self.starts[1:], len(counts))
+
+    @classmethod
+    def from_bits(cls, bits, **kwargs):
+        """Build an index from a list of equal length bitarrays, as
+        returned by ecfp_bits(), of a multiple of 64 bits"""
+        rows = [np.frombuffer(b, dtype="<u8") for b in bits]
+        return cls(np.vstack(rows).astype(np.uint64, copy=False), **kwargs)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _query(self, query):
+        """bitarray or packed uint8/uint64 array -> (1, words) uint64 row"""
+        if not isinstance(query, np.ndarray):
+            query = np.frombuffer(query, dtype=np.uint8)
+        query = np.ascontiguousarray(query)
+        if query.dtype != np.uint64:
+            query = query.view("<u8").astype(np.uint64, copy=False)
+        query = query.reshape(1, -1)
+        if query.shape[1] != self.fps.shape[1]:
+            raise ValueError("query has %d words, the index has %d" % (
+                query.shape[1], self.fps.shape[1]))
+        return query
+
+    def _threshold(self, threshold):
+        if not 0 <= threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1, not %r"
+                             % (threshold,))
+
+    def _scores(self, query, qcount, start, end):
+        """Tanimoto similarity of query to the sorted rows start:end"""
+        scores = np.empty(end - start, dtype=np.float64)
+        common_dtype = np.uint16 if self.fps.shape[1] < 1024 else np.int64
+        buf = np.empty((min(self.block, end - start), self.fps.shape[1]),
+                       dtype=np.uint64)
+        for lo in range(start, end, self.block):
+            hi = min(lo + self.block, end)
+            common = np.bitwise_and(self.fps[lo:hi], query, out=buf[:hi - lo])
+            common = _popcount(common, common_dtype)
+            union = qcount + self.counts[lo:hi] - common
+            np.divide(common, union, out=scores[lo - start:hi - start],
+                      where=union > 0)
+            scores[lo - start:hi - start][union == 0] = 0.0
+        return scores
+
+    def _results(self, rows, scores):
+        order = np.argsort(-scores, kind="stable")
+        rows = rows[order]
+        if self.order is not None:
+            rows = self.order[rows]
+        return rows, scores[order]
+
+    def threshold(self, query, threshold=0.7):
+        """Find all fingerprints with a Tanimoto similarity to query of at
+        least threshold.
+
+        :rtype: (indices, scores) arrays sorted by decreasing score
+        """
+        self._threshold(threshold)
+        query = self._query(query)
+        qcount = int(_popcount(query)[0])
+
+        # popcounts that can reach the threshold
+        start = 0
+        end = len(self.counts)
+        if threshold > 0:
+            # allow for rounding in threshold * qcount, scores decide
+            start = np.searchsorted(self.counts, threshold * qcount - 1e-9,
+                                    "left")
+            end = np.searchsorted(self.counts, qcount / threshold + 1e-9,
+                                  "right")
+
+        scores = self._scores(query, qcount, start, end)
+        keep = np.flatnonzero(scores >= threshold)
+        return self._results(keep + start, scores[keep])
+
+    def topk(self, query, k=10, threshold=0.0):
+        """Find the k fingerprints most similar to query with a Tanimoto
+        similarity of at least threshold.
+
+        Popcount groups are searched in order of decreasing upper bound
+        and the search stops once no group left can beat the k'th best.
+
+        :rtype: (indices, scores) arrays sorted by decreasing score
+        """
+        self._threshold(threshold)
+        query = self._query(query)
+        qcount = int(_popcount(query)[0])
+        if k <= 0:
+            return self._results(np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        values = self.values
+        high = np.maximum(values, qcount)
+        bounds = np.divide(np.minimum(values, qcount), high,
+                           out=np.zeros(len(values)), where=high > 0)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float64)
+        for group in np.argsort(-bounds, kind="stable"):
+            bound = bounds[group]
+            if bound < threshold:
+                break
+            if len(best_scores) >= k and bound < best_scores.min():
+                break
+
+            start, end = self.starts[group], self.ends[group]
+            scores = self._scores(query, qcount, start, end)
+            keep = np.flatnonzero(scores >= threshold)
+            best_rows = np.append(best_rows, keep + start)
+            best_scores = np.append(best_scores, scores[keep])
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows = best_rows[top]
+                best_scores = best_scores[top]
+
+        return self._results(best_rows, best_scores)
@@ -60,7 +60,8 @@ class Atom(object):
                  "rings", "bonds", "oatoms", "_closure", "chirality",
                  "chiral_class", "x", "y", "z", "parent", "handle",
                  "valences", "number", "mass", "negativity", "name",
-                 "_chirality", "_line", "has_explicit_hcount"
+                 "_chirality", "_line", "has_explicit_hcount",
+                 "_findbonds"
                 ]
     def __init__(self, generator=defaultGenerator):
         self.symbol = None
@@ -81,6 +82,7 @@ class Atom(object):
         self.rings = []
         self.bonds = []
         self.oatoms = []
+        self._findbonds = None
         self._closure = 0
         self.chirality = None
         self._chirality = None
@@ -105,11 +107,15 @@ class Atom(object):
 ## properties
 
     def findbond(self, otherAtom):
-        handle = otherAtom.handle
-        for atom, bond in zip(self.oatoms, self.bonds):
-            if handle == atom.handle:
-                return bond
-        return None
+        """(otherAtom)->the bond between this atom and otherAtom or None"""
+        findbonds = self._findbonds
+        # the table is rebuilt when bonds were added or removed
+        # behind its back, add_bond and remove_bond keep it current
+        if findbonds is None or len(findbonds) != len(self.bonds):
+            findbonds = self._findbonds = {}
+            for atom, bond in zip(self.oatoms, self.bonds):
+                findbonds[atom.handle] = bond
+        return findbonds.get(otherAtom.handle)
 
     def sumBondOrders(self):
         result = 0
@@ -123,10 +129,50 @@ class Atom(object):
                 result += x.bondorder
         return result
 
+    def copy(self):
+        """-> a copy of the atom with a new handle, the bonds, oatoms,
+        rings and chirality still refer to the original molecule"""
+        new = Atom.__new__(self.__class__)
+        new.symbol = self.symbol
+        new.number = self.number
+        new.name = self.name
+        new.mass = self.mass
+        new.negativity = self.negativity
+        new.valences = self.valences
+        new.hcount = self.hcount
+        new.explicit_hcount = self.explicit_hcount
+        new.has_explicit_hcount = self.has_explicit_hcount
+        new.imp_hcount = self.imp_hcount
+        new.charge = self.charge
+        new.weight = self.weight
+        new.aromatic = self.aromatic
+        new.chiral_order = self.chiral_order
+        new.adjunct = self.adjunct
+        new.equiv_class = self.equiv_class
+        new.symclass = self.symclass
+        new.symorder = self.symorder
+        new.index = self.index
+        new.rings = self.rings
+        new.bonds = self.bonds
+        new.oatoms = self.oatoms
+        new._findbonds = None
+        new._closure = self._closure
+        new.chirality = self.chirality
+        new._chirality = self._chirality
+        new.chiral_class = self.chiral_class
+        new.x = self.x
+        new.y = self.y
+        new.z = self.z
+        new._line = self._line
+        new.parent = self.parent
+        new.handle = id(new)
+        return new
+
     def destroy(self):
         self.rings = []
         self.bonds = []
         self.oatoms = []
+        self._findbonds = None
 
     def chival(self, bonds):
         """compute the chiral value around an atom given a list of bonds"""
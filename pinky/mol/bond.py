@@ -77,6 +77,27 @@ class Bond(object):
         self.handle = id(self) #generator() # generate a new unique
                                #   # handle
            
+    def copy(self):
+        """-> a copy of the bond with a new handle, the atoms and rings
+        still refer to the original molecule"""
+        new = Bond.__new__(self.__class__)
+        new.symbol = self.symbol
+        new.bondorder = self.bondorder
+        new.bondtype = self.bondtype
+        new.equiv_class = self.equiv_class
+        new.fixed = self.fixed
+        new.stereo = self.stereo
+        new.aromatic = self.aromatic
+        new.adjunct = self.adjunct
+        new.atoms = self.atoms
+        new.index = self.index
+        new.rings = self.rings
+        new._closure = self._closure
+        new.dbo = self.dbo
+        new.parent = self.parent
+        new.handle = id(new)
+        return new
+
     def setdbo(self, bond1, bond2, dboval):
         """Set the double bond orientation for bond1 and bond2
         based on this bond"""
@@ -124,17 +145,21 @@ class Bond(object):
             a2.bonds.remove(self)
             a1.oatoms.remove(a2)
             a2.oatoms.remove(a1)
+            if a1._findbonds is not None:
+                a1._findbonds.pop(a2.handle, None)
+            if a2._findbonds is not None:
+                a2._findbonds.pop(a1.handle, None)
         self.rings = []
                 
     def xatom(self, atom):
         """(atom)->return the atom at the other end of this bond
         or None if atom is not part of this bond"""
-        handle = atom.handle
-        
-        if handle == self.atoms[0].handle:
-            return self.atoms[1]
-        elif handle == self.atoms[1].handle:
-            return self.atoms[0]
+        # handles are unique to each atom so identity is enough
+        atom1, atom2 = self.atoms
+        if atom is atom1:
+            return atom2
+        elif atom is atom2:
+            return atom1
         return None
         
 
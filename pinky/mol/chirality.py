@@ -97,6 +97,15 @@ class T:
         if chirality == "@@":
             order[-1], order[-0] = order[-0], order[-1]
 
+    def copy(self, atom_map):
+        """(atom_map)->the same chirality for the atoms that atom_map
+        maps the handles of the original atoms to"""
+        new = self.__class__.__new__(self.__class__)
+        new.order = [atom_map[x.handle] for x in self.order]
+        new._initialOrder = [atom_map[h].handle for h in self._initialOrder]
+        new.chirality = self.chirality
+        return new
+
     def __str__(self):
         text = "Chirality\n"\
                " %s -> %s"%(self.order, self.chirality)
@@ -0,0 +1,273 @@
+"""
+A compact, array backed molecule.
+
+CompactMolecule stores the same information as a perceived Molecule
+without any Atom, Bond or Cycle objects.  Every atom, bond and cycle
+property is a typed column with one entry per atom (bond, cycle), and
+all the columns share a single bytes buffer, so a drug sized molecule
+takes about a tenth of the memory of its object graph.
+
+The adjacency is in CSR form: the neighbors of atom i are
+neighbors[indptr[i]:indptr[i+1]], joined to it by the bonds
+edge_bonds[indptr[i]:indptr[i+1]], in the order of atom.oatoms.  The
+cycles are stored the same way with cycle_indptr.
+
+    mol = smilin('c1ccccc1O', compact=True)
+    mol.natoms, mol.neighbors_of(6), mol.atom_symbol(6)
+    mol.to_molecule().cansmiles()
+
+Columns are read only memoryviews, np.asarray(mol.charge) and friends
+give NumPy arrays without a copy.
+"""
+from array import array
+
+from .atom import Atom
+from .atypes import defaultAtomTypes
+from .bond import Bond, UP, DOWN
+from .molecule import Molecule
+from ..perception.cycle import Cycle
+
+SYMBOLS = [None] * (max(t[1] for t in defaultAtomTypes.values()) + 1)
+for _symbol, _type in defaultAtomTypes.items():
+    SYMBOLS[_type[1]] = _symbol
+del _symbol, _type
+
+BOND_SYMBOLS = ['-', '=', '#', '\\', '/', ':']
+BOND_SYMBOL_CODES = {symbol: i for i, symbol in enumerate(BOND_SYMBOLS)}
+STEREO = [None, UP, DOWN]
+STEREO_CODES = {None: 0, UP: 1, DOWN: 2}
+
+# atom_flags
+AROMATIC = 1
+EXPLICIT_HCOUNT = 2
+CLOSURE = 4
+# bond_flags are AROMATIC, CLOSURE, FIXED and the stereo code << 3
+FIXED = 2
+
+# (column, typecode, count, times, plus), the column has
+# count * times + plus entries where count is natoms, nbonds, ncycles
+# or ncycle_atoms.  Wider types come first so every column is aligned.
+COLUMNS = [
+    ("indptr", "i", "natoms", 1, 1),
+    ("neighbors", "i", "nbonds", 2, 0),
+    ("edge_bonds", "i", "nbonds", 2, 0),
+    ("bond_atoms", "i", "nbonds", 2, 0),
+    ("cycle_indptr", "i", "ncycles", 1, 1),
+    ("cycle_atoms", "i", "ncycle_atoms", 1, 0),
+    ("cycle_bonds", "i", "ncycle_atoms", 1, 0),
+    ("number", "B", "natoms", 1, 0),
+    ("charge", "b", "natoms", 1, 0),
+    ("hcount", "B", "natoms", 1, 0),
+    ("explicit_hcount", "B", "natoms", 1, 0),
+    ("imp_hcount", "b", "natoms", 1, 0),
+    ("atom_flags", "B", "natoms", 1, 0),
+    ("bond_symbol", "B", "nbonds", 1, 0),
+    # twice the bond order, aromatic bonds have order 1.5
+    ("bond_order", "B", "nbonds", 1, 0),
+    ("bond_type", "B", "nbonds", 1, 0),
+    ("bond_flags", "B", "nbonds", 1, 0),
+    ("cycle_aromatic", "B", "ncycles", 1, 0),
+]
+ITEMSIZE = {code: array(code).itemsize for code in "iBb"}
+
+class CompactMolecule(object):
+    """CompactMolecule(natoms, nbonds, ncycles, ncycle_atoms, data)
+
+    Use from_molecule(), from_atoms() or smilin(..., compact=True)
+    rather than building one directly.  Isotopes and chirality, which
+    few atoms have, are kept in the extra dictionary
+    {atom index: (weight, chirality, chiral_class)}, None if empty.
+    """
+    __slots__ = ["name", "natoms", "nbonds", "ncycles", "ncycle_atoms",
+                 "data", "extra", "perceived"]
+
+    def __init__(self, natoms, nbonds, ncycles, ncycle_atoms, data,
+                 extra=None, name="", perceived=False):
+        self.natoms = natoms
+        self.nbonds = nbonds
+        self.ncycles = ncycles
+        self.ncycle_atoms = ncycle_atoms
+        self.data = data
+        self.extra = extra
+        self.name = name
+        # did the molecule go through ring perception (has mol.rings)
+        self.perceived = perceived
+
+    def _column(self, name):
+        """memoryview of a column of data"""
+        offset = 0
+        for column, code, count, times, plus in COLUMNS:
+            size = (getattr(self, count) * times + plus) * ITEMSIZE[code]
+            if column == name:
+                return memoryview(self.data)[offset:offset + size].cast(code)
+            offset += size
+        raise KeyError(name)
+
+    @classmethod
+    def from_atoms(cls, atoms, bonds, cycles=(), name="", perceived=False):
+        """(atoms, bonds, cycles=(), name="", perceived=False)->CompactMolecule
+        Compact a graph of Atom and Bond objects, such as the atoms
+        and bonds collected by BuildMol"""
+        atom_index = {}
+        for i, atom in enumerate(atoms):
+            atom_index[atom.handle] = i
+        bond_index = {}
+        for i, bond in enumerate(bonds):
+            bond_index[bond.handle] = i
+
+        columns = {column[0]: [] for column in COLUMNS}
+        indptr = columns["indptr"]
+        indptr.append(0)
+        neighbors = columns["neighbors"]
+        edge_bonds = columns["edge_bonds"]
+        extra = {}
+        for i, atom in enumerate(atoms):
+            columns["number"].append(atom.number)
+            columns["charge"].append(atom.charge)
+            columns["hcount"].append(atom.hcount)
+            columns["explicit_hcount"].append(atom.explicit_hcount)
+            columns["imp_hcount"].append(atom.imp_hcount)
+            columns["atom_flags"].append(
+                (atom.aromatic and AROMATIC) |
+                (atom.has_explicit_hcount and EXPLICIT_HCOUNT) |
+                (atom._closure and CLOSURE))
+            if atom.weight or atom.chirality is not None or \
+               atom.chiral_class is not None:
+                extra[i] = (atom.weight, atom.chirality, atom.chiral_class)
+            for oatom, bond in zip(atom.oatoms, atom.bonds):
+                neighbors.append(atom_index[oatom.handle])
+                edge_bonds.append(bond_index[bond.handle])
+            indptr.append(len(neighbors))
+
+        for bond in bonds:
+            a1, a2 = bond.atoms
+            columns["bond_atoms"].append(atom_index[a1.handle])
+            columns["bond_atoms"].append(atom_index[a2.handle])
+            columns["bond_symbol"].append(BOND_SYMBOL_CODES[bond.symbol])
+            columns["bond_order"].append(int(2 * bond.bondorder))
+            columns["bond_type"].append(bond.bondtype)
+            columns["bond_flags"].append(
+                (bond.aromatic and AROMATIC) | (bond.fixed and FIXED) |
+                (bond._closure and CLOSURE) | STEREO_CODES[bond.stereo] << 3)
+
+        columns["cycle_indptr"].append(0)
+        for cycle in cycles:
+            columns["cycle_atoms"].extend([atom_index[a.handle]
+                                           for a in cycle.atoms])
+            columns["cycle_bonds"].extend([bond_index[b.handle]
+                                           for b in cycle.bonds])
+            columns["cycle_indptr"].append(len(columns["cycle_atoms"]))
+            columns["cycle_aromatic"].append(cycle.aromatic)
+
+        data = b"".join([array(code, columns[column]).tobytes()
+                         for column, code, count, times, plus in COLUMNS])
+        return cls(len(atoms), len(bonds), len(columns["cycle_aromatic"]),
+                   len(columns["cycle_atoms"]), data, extra or None, name,
+                   perceived)
+
+    @classmethod
+    def from_molecule(cls, molecule):
+        """(molecule)->CompactMolecule"""
+        return cls.from_atoms(molecule.atoms, molecule.bonds,
+                              molecule.cycles, molecule.name,
+                              hasattr(molecule, "rings"))
+
+    def to_molecule(self):
+        """->Molecule with the same atoms, bonds, rings and chirality"""
+        atoms = []
+        for number, charge, hcount, explicit_hcount, imp_hcount, flags in \
+                zip(self.number, self.charge, self.hcount,
+                    self.explicit_hcount, self.imp_hcount, self.atom_flags):
+            atom = Atom()
+            atom.set_symbol(SYMBOLS[number])
+            atom.charge = charge
+            atom.hcount = hcount
+            atom.explicit_hcount = explicit_hcount
+            atom.imp_hcount = imp_hcount
+            atom.aromatic = int(bool(flags & AROMATIC))
+            atom.has_explicit_hcount = bool(flags & EXPLICIT_HCOUNT)
+            atom._closure = int(bool(flags & CLOSURE))
+            atoms.append(atom)
+        if self.extra:
+            for i, (weight, chirality, chiral_class) in self.extra.items():
+                atoms[i].weight = weight
+                atoms[i].chirality = chirality
+                atoms[i].chiral_class = chiral_class
+
+        bonds = []
+        bond_atoms = self.bond_atoms
+        for i, (symbol, order, bondtype, flags) in enumerate(
+                zip(self.bond_symbol, self.bond_order, self.bond_type,
+                    self.bond_flags)):
+            bond = Bond()
+            bond.symbol = BOND_SYMBOLS[symbol]
+            bond.bondorder = order // 2 if order % 2 == 0 else order / 2
+            bond.equiv_class = bond.bondtype = bondtype
+            bond.aromatic = int(bool(flags & AROMATIC))
+            bond.fixed = int(bool(flags & FIXED))
+            bond._closure = int(bool(flags & CLOSURE))
+            bond.stereo = STEREO[flags >> 3]
+            bond.atoms = [atoms[bond_atoms[2*i]], atoms[bond_atoms[2*i+1]]]
+            bonds.append(bond)
+
+        indptr = self.indptr
+        neighbors = self.neighbors
+        edge_bonds = self.edge_bonds
+        for i, atom in enumerate(atoms):
+            start, end = indptr[i], indptr[i+1]
+            atom.oatoms = [atoms[j] for j in neighbors[start:end]]
+            atom.bonds = [bonds[j] for j in edge_bonds[start:end]]
+
+        mol = Molecule(atoms, bonds)
+        mol.name = self.name
+        cycle_indptr = self.cycle_indptr
+        cycle_atoms = self.cycle_atoms
+        cycle_bonds = self.cycle_bonds
+        cycles = []
+        for r, aromatic in enumerate(self.cycle_aromatic):
+            start, end = cycle_indptr[r], cycle_indptr[r+1]
+            cycles.append(Cycle([atoms[j] for j in cycle_atoms[start:end]],
+                                [bonds[j] for j in cycle_bonds[start:end]],
+                                aromatic))
+        mol.cycles = cycles
+        if self.perceived:
+            mol.rings = [(cycle.atoms[:], cycle.bonds[:]) for cycle in cycles]
+        return mol
+
+    def atom_symbol(self, i):
+        """element symbol of atom i"""
+        return SYMBOLS[self.number[i]]
+
+    def degree(self, i):
+        indptr = self.indptr
+        return indptr[i+1] - indptr[i]
+
+    def neighbors_of(self, i):
+        """indices of the atoms bonded to atom i"""
+        indptr = self.indptr
+        return self.neighbors[indptr[i]:indptr[i+1]]
+
+    def bonds_of(self, i):
+        """indices of the bonds of atom i, in the order of neighbors_of(i)"""
+        indptr = self.indptr
+        return self.edge_bonds[indptr[i]:indptr[i+1]]
+
+    def cycle(self, r):
+        """(atom indices, bond indices) around cycle r"""
+        cycle_indptr = self.cycle_indptr
+        start, end = cycle_indptr[r], cycle_indptr[r+1]
+        return self.cycle_atoms[start:end], self.cycle_bonds[start:end]
+
+    def __repr__(self):
+        return "%s(%s atoms, %s bonds)" % (self.__class__.__name__,
+                                           self.natoms, self.nbonds)
+
+def _column_property(name):
+    def get(self):
+        return self._column(name)
+    get.__doc__ = "the %s column" % name
+    return property(get)
+
+for _column in COLUMNS:
+    setattr(CompactMolecule, _column[0], _column_property(_column[0]))
+del _column
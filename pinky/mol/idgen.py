@@ -42,15 +42,21 @@ generator() -> returns 1
 generator = IdGenerator(1000)
 generator() -> returns 1000
 generator() -> returns 1001
+
+The generators can be shared between threads, every call returns a
+different number.
 """
+import threading
 
 class IdGenerator:
     def __init__(self, start=1):
         self.start = start-1
+        self._lock = threading.Lock()
 
     def __call__(self):
-        self.start += 1
-        return self.start
+        with self._lock:
+            self.start += 1
+            return self.start
 
 defaultGenerator = IdGenerator()
 
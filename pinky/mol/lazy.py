@@ -0,0 +1,103 @@
+"""
+Deferred ring and aromaticity perception.
+
+lazy(mol, perceive) marks a freshly built molecule as not yet perceived
+by switching its molecule, atoms and bonds to the Lazy* subclasses
+below.  Those shadow every attribute that perception computes or
+changes with a property that runs perceive(mol) first.  perceive
+switches everything back to the plain classes before running the
+transforms, so the perception happens exactly once and a perceived
+molecule is indistinguishable from (and as fast as) one that was
+perceived eagerly.
+
+Properties that only depend on the SMILES graph (atom symbols, numbers,
+charges, len(mol.atoms), len(mol.bonds), ...) never trigger it.
+Errors raised by the perception are raised by the access that
+triggered it, and again by the next one.
+"""
+from .atom import Atom
+from .bond import Bond
+from .molecule import Molecule
+
+def _perceived(name, molecule=lambda self: self.parent):
+    """property of an attribute that is only valid after perception,
+    molecule(self) is the molecule to perceive"""
+    def get(self):
+        molecule(self).perceive()
+        return getattr(self, name)
+
+    def set(self, value):
+        molecule(self).perceive()
+        setattr(self, name, value)
+
+    return property(get, set)
+
+class LazyAtom(Atom):
+    __slots__ = ()
+    rings = _perceived("rings")
+    aromatic = _perceived("aromatic")
+    hcount = _perceived("hcount")
+    imp_hcount = _perceived("imp_hcount")
+
+class LazyBond(Bond):
+    __slots__ = ()
+    rings = _perceived("rings")
+    aromatic = _perceived("aromatic")
+    bondtype = _perceived("bondtype")
+    bondorder = _perceived("bondorder")
+    symbol = _perceived("symbol")
+    fixed = _perceived("fixed")
+    equiv_class = _perceived("equiv_class")
+    stereo = _perceived("stereo")
+
+def _perceived_method(name):
+    """molecule method that runs the perception first"""
+    def method(self, *args, **kwargs):
+        self.perceive()
+        return getattr(self, name)(*args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(Molecule, name).__doc__
+    return method
+
+class LazyMolecule(Molecule):
+    cycles = _perceived("cycles", lambda self: self)
+    rings = _perceived("rings", lambda self: self)
+    cansmiles = _perceived_method("cansmiles")
+    canonical_hash = _perceived_method("canonical_hash")
+    arbsmiles = _perceived_method("arbsmiles")
+    arbsmarts = _perceived_method("arbsmarts")
+    copy = _perceived_method("copy")
+    add_atom = _perceived_method("add_atom")
+    add_bond = _perceived_method("add_bond")
+    remove_atom = _perceived_method("remove_atom")
+    remove_bond = _perceived_method("remove_bond")
+    pruneToAtoms = _perceived_method("pruneToAtoms")
+
+    def perceive(self):
+        """Run the pending perception now, if it fails the molecule
+        stays unperceived and the next access runs it again"""
+        perceive = self.__dict__.pop("_perceive")
+        self.__class__ = Molecule
+        for atom in self.atoms:
+            atom.__class__ = Atom
+        for bond in self.bonds:
+            bond.__class__ = Bond
+        # figueras.sssr sets these, keep them if a transform doesn't
+        self.cycles = []
+        try:
+            perceive(self)
+        except BaseException:
+            lazy(self, perceive)
+            raise
+
+def lazy(mol, perceive):
+    """(mol, perceive)->mol
+    Defer perceive(mol) until mol, its atoms or bonds need it"""
+    del mol.cycles
+    mol._perceive = perceive
+    for atom in mol.atoms:
+        atom.__class__ = LazyAtom
+    for bond in mol.bonds:
+        bond.__class__ = LazyBond
+    mol.__class__ = LazyMolecule
+    return mol
@@ -35,9 +35,18 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 # sheesh, how much indirection can there be?
 # I'm longing for Mitch's Graph.T right about
 # now :)
-from ..canonicalization import disambiguate, traverse
+import hashlib
+import struct
+
+from ..canonicalization import disambiguate, refine, traverse
 from ..canonicalization.equiv import compute_equiv_class
 
+# the symmetry order engines Molecule.cansmiles can rank the atoms with
+RANKINGS = {"freed": disambiguate.FreedDisambiguate,
+            "refine": refine.PartitionRefinement}
+# the engines whose ranks are canonical, see Molecule.canonical_hash
+CANONICAL_RANKINGS = ("refine",)
+
 
 # for now these molecules will be immutable
 # Fix Me, don't use _atoms use atom.parent
@@ -65,7 +74,8 @@ class Molecule(object):
         self.fields = {}
         self.cycles = []
 
-        self._canonical = None
+        self._cache = {}      # derived properties, see _rank
+        self._ranking = None  # the RANKINGS engine of the symorders
         self.dirty = 1   # a molecule is dirty
                          #  when it needs to be recanonicalized
                          #  or various properties need to be updated
@@ -85,7 +95,7 @@ class Molecule(object):
         atom.index = len(self.atoms)
         
         self.atoms.append(atom)
-        self.dirty = 1
+        self._changed()
         if self.vfgraph:
             index = self.vfgraph.InsertNode(atom)
             assert index == atom.index
@@ -108,8 +118,12 @@ class Molecule(object):
         atom2.bonds.append(bond)
         atom1.oatoms.append(atom2)
         atom2.oatoms.append(atom1)
+        if atom1._findbonds is not None:
+            atom1._findbonds[atom2.handle] = bond
+        if atom2._findbonds is not None:
+            atom2._findbonds[atom1.handle] = bond
 
-        self.dirty = 1
+        self._changed()
         if self.vfgraph:
             vfgraph = self.vfgraph
             vfgraph.InsertEdge(index1, index2, bond)
@@ -118,7 +132,7 @@ class Molecule(object):
     def remove_bond(self, bond):
         self.bonds.remove(bond)
         bond.destroy()
-        self.dirty = 1
+        self._changed()
         self.vfgraph = None
         index = 0
         for bond in self.bonds:
@@ -135,57 +149,200 @@ class Molecule(object):
         self.atoms.remove(atom)        
         atom.parent = None
         atom.destroy()
-        self.dirty = 1
+        self._changed()
         self.vfgraph = None
         index = 0
         for atom in self.atoms:
             atom.index = index
             index += 1
             
-    def cansmiles(self, isomeric=0):
-        if isomeric: draw = traverse.drawIsomeric
-        else: draw = traverse.draw
-        
+    def _changed(self):
+        """forget everything derived from the graph, it changed"""
+        self._cache.clear()
+        self._ranking = None
+        self.dirty = 1
+
+    def perceive(self):
+        """Run any perception deferred by smilin(..., lazy=True), see
+        pinky.mol.lazy"""
+        pass
+
+    def copy(self):
+        """-> an independent copy of the molecule graph, including the
+        perceived rings and chirality, without any canonical results"""
+        atom_map = {}
+        for atom in self.atoms:
+            atom_map[atom.handle] = atom.copy()
+
+        bond_map = {}
+        for bond in self.bonds:
+            new = bond.copy()
+            new.atoms = [atom_map[a.handle] for a in bond.atoms]
+            bond_map[bond.handle] = new
+
+        cycle_map = {}
+        cycles = []
+        for cycle in self.cycles:
+            new = cycle.__class__.__new__(cycle.__class__)
+            new.__dict__.update(cycle.__dict__)
+            new.atoms = [atom_map[a.handle] for a in cycle.atoms]
+            new.bonds = [bond_map[b.handle] for b in cycle.bonds]
+            cycle_map[id(cycle)] = new
+            cycles.append(new)
+
+        atoms = [atom_map[a.handle] for a in self.atoms]
+        bonds = [bond_map[b.handle] for b in self.bonds]
+        mol = self.__class__.__new__(self.__class__)
+        mol.__dict__.update(self.__dict__)
+        mol.atoms = atoms
+        mol.bonds = bonds
+        mol.cycles = cycles
+        mol.fields = self.fields.copy()
+        mol._cache = {}
+        mol._ranking = None
+        mol.dirty = 1
+        mol.vfgraph = None
+        for name in ("canonical_list", "arb_list"):
+            mol.__dict__.pop(name, None)
+        if hasattr(self, "rings"):
+            mol.rings = [([atom_map[a.handle] for a in ratoms],
+                          [bond_map[b.handle] for b in rbonds])
+                         for ratoms, rbonds in self.rings]
+
+        for atom in atoms:
+            atom.parent = mol
+            atom.bonds = [bond_map[b.handle] for b in atom.bonds]
+            atom.oatoms = [atom_map[a.handle] for a in atom.oatoms]
+            atom.rings = [cycle_map[id(c)] for c in atom.rings]
+            if atom._chirality is not None:
+                atom._chirality = atom._chirality.copy(atom_map)
+        for bond in bonds:
+            bond.parent = mol
+            bond.rings = [cycle_map[id(c)] for c in bond.rings]
+        return mol
+
+    def cansmiles(self, isomeric=0, ranking="freed"):
+        """(isomeric=0, ranking="freed")->canonical smiles
+        ranking picks the engine that orders the atoms, "freed"
+        (FreedDisambiguate) or "refine" (PartitionRefinement).  Both
+        are canonical but they give different SMILES."""
+        self._rank(ranking)
+        cache = self._cache
+        if isomeric:
+            key = ("isomeric", ranking)
+            if key not in cache:
+                cache[key] = traverse.drawIsomeric(self)[0]
+            return cache[key]
+
+        key = ("cansmiles", ranking)
+        if key not in cache:
+            cache[key] = traverse.draw(self)
+        canonical, self.canonical_list = cache[key]
+        return canonical
+
+    def _rank(self, ranking="freed"):
+        """(ranking="freed") give the atoms their canonical symclass
+        and symorder with the ranking engine, unless they already
+        have them
+
+        Everything derived from the graph is kept in _cache until
+        add_atom, add_bond, remove_bond or remove_atom change it, or
+        dirty is set by hand: the equiv_classes, the symclasses and
+        symorders of each ranking engine and the SMILES, SMARTS and
+        hashes drawn from them."""
+        if ranking not in RANKINGS:
+            raise ValueError("unknown ranking %r" % (ranking,))
         if self.dirty:
-            # XXX FIX ME
-            # Move equivalence_class setter outside?
-            # recompute the equivalence classes
-            for atom in self.atoms:
-                atom.equiv_class = compute_equiv_class(atom)
-            disambiguate.FreedDisambiguate(self)
-            self._canonical, self.canonical_list = traverse.draw(self)
+            self._changed()
             self.dirty = 0
+        if ranking == self._ranking:
+            return
 
-        if isomeric:
-            return traverse.drawIsomeric(self)[0]
-        return self._canonical
+        cache = self._cache
+        key = ("ranks", ranking)
+        if key in cache:
+            for atom, symclass, symorder in cache[key]:
+                atom.symclass = symclass
+                atom.symorder = symorder
+        else:
+            if "equiv_classes" not in cache:
+                for atom in self.atoms:
+                    atom.equiv_class = compute_equiv_class(atom)
+                cache["equiv_classes"] = 1
+            RANKINGS[ranking](self)
+            cache[key] = [(atom, atom.symclass, atom.symorder)
+                          for atom in self.atoms]
+        self._ranking = ranking
+
+    def canonical_hash(self, bits=64, ranking="refine"):
+        """(bits=64, ranking="refine")->canonical hash as an integer
+        of 64 or 128 bits
+
+        A digest of the atom equiv_classes and aromaticity in
+        symorder, followed by the bonds as sorted (rank, rank,
+        equiv_class) triples, so the SMILES are never drawn.  It is
+        the same on every platform and python version.
+
+        Only the ranks themselves are hashed, so the ranking must be
+        canonical for the hash to be: "freed" breaks the ties left
+        between its symmetry classes by atom index, which the drawn
+        SMILES mostly hide but the ranks do not.  Rankings that are not
+        in CANONICAL_RANKINGS raise ValueError."""
+        if bits not in (64, 128):
+            raise ValueError("bits must be 64 or 128, not %r" % (bits,))
+        if ranking not in CANONICAL_RANKINGS:
+            raise ValueError("canonical_hash needs a canonical ranking, "
+                             "one of %s, not %r" % (CANONICAL_RANKINGS,
+                                                    ranking))
+        self._rank(ranking)
+        key = ("hash", ranking)
+        if key not in self._cache:
+            atoms = sorted(self.atoms, key=lambda atom: atom.symorder)
+            ranks = {}
+            values = [len(atoms)]
+            for atom in atoms:
+                ranks[atom] = len(ranks)
+                values.append(atom.equiv_class)
+                values.append(atom.aromatic and 1 or 0)
+            bonds = []
+            for bond in self.bonds:
+                rank1, rank2 = ranks[bond.atoms[0]], ranks[bond.atoms[1]]
+                if rank1 > rank2:
+                    rank1, rank2 = rank2, rank1
+                bonds.append((rank1, rank2, bond.equiv_class))
+            bonds.sort()
+            values.append(len(bonds))
+            for bond in bonds:
+                values.extend(bond)
+            data = struct.pack("<%dq" % len(values), *values)
+            self._cache[key] = hashlib.blake2b(data,
+                                               digest_size=16).digest()
+        return int.from_bytes(self._cache[key][:bits // 8], "big")
 
     def arbsmarts(self, isomeric=0):
         # XXX FIX ME
         # compute canonicalization smarts
         # without hydrogens and charges
-        canonical, canonical_list = traverse.drawSmarts(self)
-        return canonical
+        if self.dirty or self._ranking is None:
+            # the symorders are whatever the atoms hold
+            canonical, canonical_list = traverse.drawSmarts(self)
+            return canonical
+        key = ("arbsmarts", self._ranking)
+        if key not in self._cache:
+            self._cache[key] = traverse.drawSmarts(self)[0]
+        return self._cache[key]
             
     def arbsmiles(self, isomeric=0):
         if isomeric: draw = traverse.drawIsomeric
         else: draw = traverse.draw
         
-        symorders = [atom.symorder for atom in self.atoms]
-
-        # XXX FIX ME - kind of a hack!
-        # set all the symorders to the index of the
-        #  atom in self.atoms
-        i = 0
-        for atom in self.atoms:
-            atom.symorder = i
-            i+= 1
-            
-        result, self.arb_list = draw(self)
+        # draw the atoms in the order of self.atoms, their own
+        #  symorders are left alone
+        orders = {}
+        for i, atom in enumerate(self.atoms):
+            orders[atom] = i
 
-        # restore the symorders
-        for atom, order in zip(self.atoms, symorders):
-            atom.symorder = order
+        result, self.arb_list = draw(self, orders=orders)
 
         return result    
 
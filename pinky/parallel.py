@@ -0,0 +1,111 @@
+"""
+Parse SMILES and compute fingerprints on several processes.
+
+The input records are split into chunks of lines which are handed to a
+pool of worker processes.  Each worker runs smilin() and ecfp() (and
+optionally cansmiles()) over its chunk and sends back only the results,
+never the molecules themselves.  Results are yielded in input order.
+
+    from pinky.parallel import fingerprints
+
+    for rec in fingerprints('library.smi', radius=2, processes=32):
+        if rec.error:
+            print(rec.lineno, rec.error)
+        else:
+            print(rec.name, rec.fp)
+"""
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .exceptions import SmilesRecordError
+from .fingerprints import ecfp, ecfp_bits
+from .smiles.parser import TRANSFORMS, _smilin_lines
+
+# One result per input record.  fp and cansmiles are None when the
+# record failed, in which case error holds the reason.
+Record = namedtuple("Record", ["lineno", "name", "fp", "cansmiles", "error"])
+
+def _chunks(lines, chunksize):
+    """(lines, chunksize)->iterator of (lineno, chunk)"""
+    lines = iter(lines)
+    lineno = 1
+    while True:
+        chunk = list(islice(lines, chunksize))
+        if not chunk:
+            return
+        yield lineno, chunk
+        lineno += len(chunk)
+
+def _work(lineno, lines, canonical, kwargs):
+    """Parse and fingerprint one chunk of lines, runs in the workers"""
+    fpfunc = ecfp_bits if "nbits" in kwargs else ecfp
+    results = []
+    for lineno, name, mol in _smilin_lines(lines, TRANSFORMS, "yield", lineno):
+        if isinstance(mol, SmilesRecordError):
+            results.append(Record(lineno, name, None, None, str(mol.error)))
+            continue
+        try:
+            fp = fpfunc(mol, **kwargs)
+            smiles = mol.cansmiles() if canonical else None
+        except Exception as e:
+            results.append(Record(lineno, name, None, None, str(e)))
+            continue
+        results.append(Record(lineno, name, fp, smiles, None))
+    return results
+
+def _imap(func, tasks, processes):
+    """(func, tasks, processes)->iterator of func(*task) for each task
+    in order, run on processes worker processes (1 runs in this
+    process)"""
+    if processes == 1:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    with ProcessPoolExecutor(processes) as pool:
+        # only keep a couple of tasks per worker in flight so the
+        # input is never read much further ahead than the output
+        pending = deque()
+        try:
+            for task in tasks:
+                pending.append(pool.submit(func, *task))
+                if len(pending) >= 2 * processes:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+def _fingerprints(lines, processes, chunksize, canonical, kwargs):
+    tasks = ((lineno, chunk, canonical, kwargs)
+             for lineno, chunk in _chunks(lines, chunksize))
+    for results in _imap(_work, tasks, processes):
+        yield from results
+
+def fingerprints(source, processes=None, chunksize=1000, canonical=False,
+                 nbits=None, **kwargs):
+    """Compute the ECFP fingerprint of every record in source.
+
+    :param source: path to a .smi file or an iterable of lines, see smilin_iter()
+    :param processes: number of worker processes. Defaults to os.cpu_count(), 1 runs in this process.
+    :param chunksize: number of lines sent to a worker at a time.
+    :param canonical: also compute the canonical SMILES of each record.
+    :param nbits: fold the fingerprints to nbits with ecfp_bits() instead of returning ecfp() dictionaries.
+    :param kwargs: passed on to ecfp(), e.g. radius=3
+    :rtype: iterator of Record in input order
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if nbits is not None:
+        kwargs["nbits"] = nbits
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, buffering=1 << 20) as fh:
+            yield from _fingerprints(fh, processes, chunksize, canonical,
+                                     kwargs)
+    else:
+        yield from _fingerprints(source, processes, chunksize, canonical,
+                                 kwargs)
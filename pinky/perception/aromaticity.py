@@ -32,6 +32,7 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 """
 from ..exceptions import PinkyError
+from .. import budget
 
 # XXX FIX ME
 #   this would be much better moved into a class structure
@@ -370,8 +371,12 @@ def aromatize(molecule, usedPyroles=None):
     """(molecule, usedPyroles=None)->aromatize a molecular graph
     usedPyroles is a dictionary that holds the pyrole like
     atoms that are used in the conversion process.
-    The following valence checker may need this information"""
-    
+    The following valence checker may need this information
+
+    Raises TooComplexError when the molecule goes over the atoms or
+    rounds budget, see pinky.budget"""
+    budget.check_atoms(molecule)
+    rounds = budget.start("rounds")
     pyroleLike = getPyroleLikeAtoms(molecule)
 
     if usedPyroles is None:
@@ -398,6 +403,8 @@ def aromatize(molecule, usedPyroles=None):
 
     # keep checking rings until something happens
     while 1:
+        if rounds is not None:
+            rounds.spend()
         # assume nothing happened
         needToCheckAgain = 0
 
@@ -51,32 +51,150 @@ This is also the ring detection code that CDK uses for their ring
 perception so that might be a branch to investigate.
 """
 from .cycle import Cycle
+from .. import budget
 from itertools import zip_longest
 #from CheckFiguerasRings import checkRings
 
 def sssr(molecule):
     """molecule -> generate the molecule.cycles that contain
-    the smallest set of smallest rings"""
+    the smallest set of smallest rings
+
+    Molecules without rings are done after a single pass over the
+    graph, otherwise each ring system is searched on its own.  The
+    cycles are listed ring system by ring system, in the order the
+    systems are found, so molecules with several ring systems can list
+    the same rings in a different order than a search over the whole
+    molecule would.
+
+    Raises TooComplexError when the molecule goes over the atoms or
+    expansions budget, see pinky.budget"""
+    budget.check_atoms(molecule)
+    work = budget.start("expansions")
     results = {}
     lookup = {}
-    fullSet = {}
-    oatoms = {}
-    # XXX FIX ME
-    # copy atom.oatoms to atom._oatoms
-    # atom._oatoms will be modified my the routine
 
     for atom in molecule.atoms:
         atom.rings = []
-        fullSet[atom.handle] = 1
         lookup[atom.handle] = atom
-        oatoms[atom.handle] = atom.oatoms[:]
 
     for bond in molecule.bonds:
         bond.rings = []
-        
-    trimSet = []
 
+    if cyclomatic(molecule):
+        for system in ringSystems(molecule):
+            # keep the atoms in molecule order, the search depends on it
+            fullSet = {}
+            oatoms = {}
+            for atom in molecule.atoms:
+                if atom.handle in system:
+                    fullSet[atom.handle] = 1
+                    oatoms[atom.handle] = [oatom for oatom in atom.oatoms
+                                           if oatom.handle in system]
+            findRings(fullSet, lookup, oatoms, results, work)
+
+    # assign the ring index to the atom
+    rings = []
+    index = 0
+
+    # transform the handles back to atoms
+    for result, bonds in results.values():
+        ring = []
+        for atomID in result:
+            atom = lookup[atomID]
+            assert atom.handle == atomID
+            ring.append(atom)
+        rings.append((ring, bonds))
+        index = index + 1
+
+    molecule.rings = rings
+    potentialCycles = []
+    index = 0
+    for atoms, bonds in rings:
+        # due to the dictionaries used in getRing
+        # the atoms are not in the order found
+        # we need to topologically sort these
+        # for the cycle
+        atoms, bonds = toposort(atoms, bonds)
+        potentialCycles.append((atoms, bonds))
+
+    rings = potentialCycles#checkRings(potentialCycles)
+    molecule.rings = rings
+    molecule.cycles = [Cycle(atoms, bonds) for atoms, bonds in rings]
+    return molecule
+
+def cyclomatic(molecule):
+    """molecule -> the number of independent rings, that is
+    bonds - atoms + connected components"""
+    seen = {}
+    components = 0
+    for atom in molecule.atoms:
+        if atom.handle in seen:
+            continue
+        components += 1
+        seen[atom.handle] = 1
+        stack = [atom]
+        while stack:
+            for oatom in stack.pop().oatoms:
+                if oatom.handle not in seen:
+                    seen[oatom.handle] = 1
+                    stack.append(oatom)
+    return len(molecule.bonds) - len(molecule.atoms) + components
+
+def ringSystems(molecule):
+    """molecule -> the ring systems as {atom handle: 1} dictionaries
+
+    These are the biconnected components with more than one bond
+    (Hopcroft-Tarjan), a component with a single bond is a chain bond.
+    Spiro atoms belong to both of their ring systems."""
+    order = {}
+    low = {}
+    systems = []
+    for root in molecule.atoms:
+        if root.handle in order:
+            continue
+        order[root.handle] = low[root.handle] = len(order)
+        # tree and back edges not yet assigned to a component
+        edges = []
+        stack = [(root, None, iter(root.oatoms))]
+        while stack:
+            atom, parent, neighbors = stack[-1]
+            handle = atom.handle
+            for oatom in neighbors:
+                m = oatom.handle
+                if m not in order:
+                    order[m] = low[m] = len(order)
+                    edges.append((handle, m))
+                    stack.append((oatom, handle, iter(oatom.oatoms)))
+                    break
+                elif m != parent and order[m] < order[handle]:
+                    edges.append((handle, m))
+                    low[handle] = min(low[handle], order[m])
+            else:
+                stack.pop()
+                if parent is None:
+                    continue
+                low[parent] = min(low[parent], low[handle])
+                if low[handle] >= order[parent]:
+                    # parent cuts the edges stacked since (parent, handle)
+                    # off from the rest of the graph
+                    system = {}
+                    nbonds = 0
+                    edge = None
+                    while edge != (parent, handle):
+                        edge = edges.pop()
+                        system[edge[0]] = system[edge[1]] = 1
+                        nbonds += 1
+                    if nbonds > 1:
+                        systems.append(system)
+    return systems
+
+def findRings(fullSet, lookup, oatoms, results, work=None):
+    """fullSet, lookup, oatoms, results, work=None -> add the rings
+    through the atoms in fullSet to results, fullSet and oatoms are
+    used up.  Every atom visited is spent from the work Budget"""
     while fullSet:
+        if work is not None:
+            work.spend(len(fullSet))
         nodesN2 = []
         minimum, minimum_degree = None, 100000
 
@@ -112,7 +230,7 @@ def sssr(molecule):
             # find the rings!
             startNodes = []
             for atom in nodesN2:
-                ring, bonds = getRing(atom, fullSet, lookup, oatoms)
+                ring, bonds = getRing(atom, fullSet, lookup, oatoms, work)
                 ring = list(ring)
 
                 if ring:
@@ -134,7 +252,7 @@ def sssr(molecule):
         elif minimum_degree > 2:
             # no N2 nodes so remove the "optimum" edge to create
             # N2 nodes in the next go-around.
-            ring, bonds = getRing(minimum, fullSet, lookup, oatoms)
+            ring, bonds = getRing(minimum, fullSet, lookup, oatoms, work)
             ring = list(ring)
             if ring:
                 key = ring[:]
@@ -144,42 +262,12 @@ def sssr(molecule):
                     results[key] = ring, bonds
                     atoms = map(lookup.get, ring)
                     atoms, bonds = toposort(atoms, bonds)
-                    checkEdges(atoms, lookup, oatoms)
+                    checkEdges(atoms, lookup, oatoms, work)
             else:
                 del fullSet[minimum.handle]
         else:
             raise ShouldntGetHereError
 
-    # assign the ring index to the atom
-    rings = []
-    index = 0
-
-    # transform the handles back to atoms
-    for result, bonds in results.values():
-        ring = []
-        for atomID in result:
-            atom = lookup[atomID]
-            assert atom.handle == atomID
-            ring.append(atom)
-        rings.append((ring, bonds))
-        index = index + 1
-
-    molecule.rings = rings
-    potentialCycles = []
-    index = 0
-    for atoms, bonds in rings:
-        # due to the dictionaries used in getRing
-        # the atoms are not in the order found
-        # we need to topologically sort these
-        # for the cycle
-        atoms, bonds = toposort(atoms, bonds)
-        potentialCycles.append((atoms, bonds))
-
-    rings = potentialCycles#checkRings(potentialCycles)
-    molecule.rings = rings
-    molecule.cycles = [Cycle(atoms, bonds) for atoms, bonds in rings]
-    return molecule
-
 def toposort(initialAtoms, initialBonds):
     """initialAtoms, initialBonds -> atoms, bonds
     Given the list of atoms and bonds in a ring
@@ -237,35 +325,35 @@ def toposort(initialAtoms, initialBonds):
     b_append(lastBond)
     return atoms, bonds
     
-def getRing(startAtom, atomSet, lookup, oatoms):
-    """getRing(startAtom, atomSet, lookup, oatoms)->atoms, bonds
+def getRing(startAtom, atomSet, lookup, oatoms, work=None):
+    """getRing(startAtom, atomSet, lookup, oatoms, work=None)->atoms, bonds
     starting at startAtom do a bfs traversal through the atoms
-    in atomSet and return the smallest ring found
+    in atomSet and return the smallest ring found, every atom
+    queued is spent from the work Budget as the search goes
 
     returns (), () on failure
     note: atoms and bonds are not returned in traversal order"""
+    # the bfs tree is kept by atom index: paths[i] is the set of atoms
+    # on the path from startAtom to atom i as a bitset of atom indices
+    # (0 if atom i wasn't reached) and previous[i] is the (atom, bond)
+    # that leads back towards startAtom
+    paths = [0] * len(lookup)
+    previous = [None] * len(lookup)
+    startBit = 1 << startAtom.index
 
-    path = {}
-    bpaths = {}
-    for atomID in atomSet.keys():
-        # initially the paths are empty
-        path[atomID] = None
-        bpaths[atomID] = []
-    
     q = []
     handle = startAtom.handle
+    if work is not None:
+        work.spend(len(oatoms[handle]))
     for atom in oatoms[handle]:
         q.append((atom, handle))
-        path[atom.handle] = {atom.handle:1, handle:1}
-        bpaths[atom.handle] = [startAtom.findbond(atom)]
-            
-    qIndex = 0
-    lenQ = len(q)
-
-    while qIndex < lenQ:
-        current, sourceHandle = q[qIndex]
+        paths[atom.index] = startBit | (1 << atom.index)
+        previous[atom.index] = startAtom, startAtom.findbond(atom)
+
+    # q grows while it is read
+    for current, sourceHandle in q:
         handle = current.handle
-        qIndex += 1
+        path = paths[current.index]
 
         for next in oatoms[handle]:
             m = next.handle
@@ -273,35 +361,48 @@ def getRing(startAtom, atomSet, lookup, oatoms):
             if m != sourceHandle:
                 if not m in atomSet:
                     return (), ()
-                
-                if path.get(m, None):
-                    intersections = 0
-                    for atom in path[handle].keys():
-                        if atom in path[m]:
-                            intersections = intersections + 1
-                            sharedAtom = atom
-
-                    if intersections == 1:
-                        del path[handle][sharedAtom]
-                        path[handle].update(path[m])
-                        result = path[handle].keys()
-                        bond = next.findbond(current)
-                        # assert bond not in bpaths[handle] and bond not in bpaths[m]
-                        bonds = bpaths[handle] + bpaths[m] + [bond]
-                        return result, bonds
+
+                index = next.index
+                if paths[index]:
+                    # the two paths only share startAtom
+                    if path & paths[index] == startBit:
+                        atoms, bonds = _tracePath(current, startAtom,
+                                                  previous)
+                        matoms, mbonds = _tracePath(next, startAtom,
+                                                    previous)
+                        # same order as the original dictionary paths
+                        atoms.append(matoms[0])
+                        atoms.append(startAtom.handle)
+                        atoms.extend(matoms[1:])
+                        bonds.extend(mbonds)
+                        bonds.append(next.findbond(current))
+                        return atoms, bonds
                 else:
-                    path[m] = path[handle].copy()
-                    path[m][m] = 1
-                    bond = next.findbond(current)
-                    # assert bond not in bpaths[m] and bond not in bpaths[handle]
-                    bpaths[m] = bpaths[handle] + [next.findbond(current)]
+                    if work is not None:
+                        work.spend()
+                    paths[index] = path | (1 << index)
+                    previous[index] = current, next.findbond(current)
                     q.append((next, handle))
-                    lenQ = lenQ + 1
 
     return (), ()
 
+def _tracePath(atom, startAtom, previous):
+    """atom, startAtom, previous -> handles, bonds
+    walk the bfs tree in previous from atom back to startAtom, returns
+    the atom handles (without startAtom) and the bonds from startAtom
+    to atom"""
+    handles = []
+    bonds = []
+    while atom is not startAtom:
+        handles.append(atom.handle)
+        atom, bond = previous[atom.index]
+        bonds.append(bond)
+    handles.reverse()
+    bonds.reverse()
+    return handles, bonds
+
 
-def checkEdges(ringSet, lookup, oatoms):
+def checkEdges(ringSet, lookup, oatoms, work=None):
     """atoms, lookup -> ring
     atoms must be in the order of traversal around a ring!
     break an optimal non N2 node and return the largest ring
@@ -333,8 +434,8 @@ def checkEdges(ringSet, lookup, oatoms):
         del oatoms1[index1]
         del oatoms2[index2]
 
-        ring1 = getRing(atom1, atomSet, lookup, oatoms)
-        ring2 = getRing(atom2, atomSet, lookup, oatoms)
+        ring1 = getRing(atom1, atomSet, lookup, oatoms, work)
+        ring2 = getRing(atom2, atomSet, lookup, oatoms, work)
         
         # keep the larger of the two rings
         if len(ring1) > len(ring2):
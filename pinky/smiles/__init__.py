@@ -1,2 +1,2 @@
-
-from .parser import smilin
+from .parser import smilin, smilin_iter
+from .cache import SmilesCache
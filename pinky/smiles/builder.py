@@ -37,6 +37,7 @@ import string
 from pinky.smiles import handler
 import weakref
 from ..mol import Atom, Bond, Molecule
+from ..mol.compact import CompactMolecule
 
 # bondlookup is of the form
 # textSymbol, bondsymbol, bondorder, bondtype, equiv class, stereo
@@ -75,6 +76,11 @@ class DummyVFGraph:
         pass
     
 class BuildMol(handler.TokenHandler):
+    """Builds self.mol, a Molecule, from the tokens of a SMILES string.
+    With compact=True self.mol is a CompactMolecule instead, see
+    pinky.mol.compact, built straight from the atoms and bonds."""
+    def __init__(self, compact=False):
+        self.compact = compact
 
     def begin(self):
         self.closures = {}
@@ -96,7 +102,10 @@ class BuildMol(handler.TokenHandler):
         if self.closures:
             raise AssertionError("Missing closures for %s" %
                                  (self.closures.keys(),))
-        self.mol = Molecule(self.atoms, self.bonds)
+        if self.compact:
+            self.mol = CompactMolecule.from_atoms(self.atoms, self.bonds)
+        else:
+            self.mol = Molecule(self.atoms, self.bonds)
     
     def add_token(self, field, pos, text):
         getattr(self, "do_" + field)(text)
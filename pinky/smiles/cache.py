@@ -0,0 +1,104 @@
+"""
+A bounded LRU cache of parsed SMILES.
+
+SmilesCache.smilin() parses each distinct SMILES once and hands back a
+Molecule.copy() of the cached molecule on every call, so callers are
+free to canonicalize, fingerprint or modify what they get without
+affecting the cache or each other.  A copy is several times cheaper
+than tokenizing, building and perceiving the molecule again.
+
+    from pinky.smiles import SmilesCache
+
+    cache = SmilesCache(maxsize=100000, maxbytes=512 << 20)
+    mol = cache.smilin('CCCC(=O)N')
+    print(cache.info())
+
+The size of a cached molecule is estimated from its atom and bond
+counts, maxbytes is approximate.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from .parser import TRANSFORMS, smilin
+
+CacheInfo = namedtuple("CacheInfo",
+                       ["hits", "misses", "maxsize", "currsize", "bytes"])
+
+# rough memory use of a parsed atom or bond, see SmilesCache
+ATOM_BYTES = 500
+
+def _estimate(smiles, mol):
+    return len(smiles) + ATOM_BYTES * (len(mol.atoms) + len(mol.bonds))
+
+class SmilesCache:
+    """SmilesCache(maxsize=1024, maxbytes=None, transforms=...)
+
+    Keeps at most maxsize molecules and, if maxbytes is given, about
+    maxbytes of them, dropping the least recently used first.
+    transforms are the perception steps passed on to smilin().
+    """
+    def __init__(self, maxsize=1024, maxbytes=None,
+                 transforms=TRANSFORMS):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.transforms = tuple(transforms)
+        self._mols = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._mols)
+
+    def __contains__(self, smiles):
+        return smiles in self._mols
+
+    def smilin(self, smiles):
+        """(smiles)->a new copy of the molecule, see smilin()"""
+        with self._lock:
+            entry = self._mols.get(smiles)
+            if entry is not None:
+                self._mols.move_to_end(smiles)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            # cached molecules are never modified, so copying them
+            # needs no lock
+            return entry[0].copy()
+
+        # parse errors are raised and not cached
+        mol = smilin(smiles, self.transforms)
+        size = _estimate(smiles, mol)
+        result = mol.copy()
+        with self._lock:
+            if smiles not in self._mols and self._fits(size):
+                self._mols[smiles] = (mol, size)
+                self._bytes += size
+                self._evict()
+        return result
+
+    def _fits(self, size):
+        return self.maxsize > 0 and (self.maxbytes is None or
+                                     size <= self.maxbytes)
+
+    def _evict(self):
+        while len(self._mols) > self.maxsize or (
+                self.maxbytes is not None and self._bytes > self.maxbytes):
+            _, (mol, size) = self._mols.popitem(last=False)
+            self._bytes -= size
+
+    def info(self):
+        """-> CacheInfo(hits, misses, maxsize, currsize, bytes)"""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._mols), self._bytes)
+
+    def clear(self):
+        """Drop every cached molecule and reset the statistics"""
+        with self._lock:
+            self._mols.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
@@ -30,11 +30,15 @@ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import os
 import re
 import string
 from pinky.smiles import handler
 from .builder import BuildMol
+from ..mol.lazy import lazy as _lazy
+from ..mol.compact import CompactMolecule
 from ..perception import aromaticity, figueras
+from ..exceptions import SmilesRecordError
 
 # To verify this is correct, run
 #  support.make_re_pattern(support.element_symbols + support.aromatic_symbols)
@@ -64,9 +68,7 @@ atom_fields = [
     "error_3",
     ]
 
-atom = re.compile(r"""
-(?P<raw_atom>Cl|Br|[cnospBCNOFPSI]) |  # "raw" means outside of brackets
-(
+bracket_atom_pattern = r"""
   (?P<open_bracket>\[)                 # Start bracket
   (?P<weight>\d+)?                     # Atomic weight (optional)
   (                                    # valid term or error
@@ -95,9 +97,18 @@ atom = re.compile(r"""
   ))
   ((?P<close_bracket>\])|              # End bracket
    (?P<error_3>$))                     # unexpectedly reached end of string
-)
+"""
+
+atom = re.compile(r"""
+(?P<raw_atom>Cl|Br|[cnospBCNOFPSI]) |  # "raw" means outside of brackets
+(""" + bracket_atom_pattern + r""")
 """, re.X)
 
+# The bracket part of the atom pattern on its own.  The scanner in
+# tokenize() only needs this once it has seen a '['
+bracket_atom_fields = atom_fields[1:]
+bracket_atom = re.compile(bracket_atom_pattern, re.X)
+
 bond_fields = ["bond"]
 bond = re.compile(r"(?P<bond>[=#/\\:~-])")
 
@@ -151,64 +162,126 @@ table = {
     "closure": ("atom", "bond", "closure", "close_branch", "open_branch", "dot"),
 }
 
+# Same as table but as sets for quick membership tests
+allowed = dict((state, frozenset(states)) for state, states in table.items())
+
+# Dispatch table for the scanner in tokenize().  Maps the first
+# character of a token to its (state, field).  Most tokens are a
+# single character, the exceptions are
+#   Cl and Br  -- field is "raw_atom" but may need a second character
+#   %nn        -- field is None, matched with the closure pattern
+#   [...]      -- field is None, matched with the bracket_atom pattern
+scan_table = {}
+for c in "cnospBCNOFPSI":
+    scan_table[c] = ("atom", "raw_atom")
+for c in "=#/\\:~-":
+    scan_table[c] = ("bond", "bond")
+for c in string.digits:
+    scan_table[c] = ("closure", "closure")
+scan_table["%"] = ("closure", None)
+scan_table["."] = ("dot", "dot")
+scan_table["("] = ("open_branch", "open_branch")
+scan_table[")"] = ("close_branch", "close_branch")
+scan_table["["] = ("atom", None)
+del c
+
+raw_two_letter = {"C": "Cl", "B": "Br"}
+
 # Parse a SMILES string and print the events found
 def tokenize(s, handler = handler.TokenHandler()):
-    expected = table["start"]
+    expected = allowed["start"]
     n = len(s)
     i = 0
+    add_token = handler.add_token
     handler.begin()
     while i < n:
-        # Of the expected states, find one that matches the
-        # text at the current position.
-        for state in expected:
-            pat, fields = info[state]
-            m = pat.match(s, i)
-            if m:
-                break
-        else:
+        # Find the token type from the first character and make
+        # sure it's allowed to follow the previous token
+        c = s[i]
+        try:
+            state, field = scan_table[c]
+        except KeyError:
+            state = None
+        if state not in expected:
             # No matches found, so this was an error
             handler.error("Unknown character", i, s[i:])
             # The handler is allowed to not throw an
             # exception, but we are done, so return.
             return
-        #print "New state:", state,
-
-        # Get the dictionary of matched name groups
-        d = m.groupdict()
-
-        # Go through the list of fields that could have matched.
-        # Needs to go in a order so the token text can be converted
-        # back into the original string.
-        for field in fields:
-            # See if there was a match for the given named field
-            if d[field] is not None:
-                # Was it an error match?
-                if field[:5] == "error":
-                    pos = m.start(field)
-                    if field == "error_3":
-                        handler.error("Missing ']'", pos, s[pos:])
-                    else:
-                        handler.error("Unknown character", pos, s[pos:])
-                    return
-                # Success, so send the token to the callback
-                #print "--> ", m.group(field), field
-                handler.add_token(field, i, m.group(field))
-
-        # Get the new list of expected states, and move to
-        # the end of the previous match.
-        expected = table[state]
-        i = m.end(0)
+
+        if field is not None:
+            # Fast path for single character tokens (and Cl, Br)
+            text = c
+            if c in raw_two_letter and s.startswith(raw_two_letter[c], i):
+                text = raw_two_letter[c]
+            add_token(field, i, text)
+            i += len(text)
+        elif c == "%":
+            m = closure.match(s, i)
+            if not m:
+                handler.error("Unknown character", i, s[i:])
+                return
+            add_token("closure", i, m.group())
+            i = m.end()
+        else:
+            m = bracket_atom.match(s, i)
+
+            # Get the dictionary of matched name groups
+            d = m.groupdict()
+
+            # Go through the list of fields that could have matched.
+            # Needs to go in a order so the token text can be converted
+            # back into the original string.
+            for field in bracket_atom_fields:
+                # See if there was a match for the given named field
+                if d[field] is not None:
+                    # Was it an error match?
+                    if field[:5] == "error":
+                        pos = m.start(field)
+                        if field == "error_3":
+                            handler.error("Missing ']'", pos, s[pos:])
+                        else:
+                            handler.error("Unknown character", pos, s[pos:])
+                        return
+                    # Success, so send the token to the callback
+                    add_token(field, i, d[field])
+            i = m.end()
+
+        # Get the new set of expected states
+        expected = allowed[state]
 
     handler.end()
 
-def smilin(smiles, transforms=[figueras.sssr, aromaticity.aromatize]):
-    """(smiles)->molecule
-    Convert a smiles string into a molecule representation"""
+# the perception smilin() runs by default, a tuple so it can be shared
+# by every call and thread
+TRANSFORMS = (figueras.sssr, aromaticity.aromatize)
+
+def smilin(smiles, transforms=TRANSFORMS,
+           lazy=False, compact=False):
+    """(smiles, lazy=False, compact=False)->molecule
+    Convert a smiles string into a molecule representation
+
+    With lazy=True the transforms (ring and aromaticity perception) are
+    run the first time something that depends on them is read, see
+    pinky.mol.lazy.  Checks that only need the atoms, e.g. heavy atom
+    counts or element sets, then cost no more than tokenizing.
+
+    With compact=True the perceived molecule is returned as a
+    CompactMolecule, see pinky.mol.compact."""
+    if compact and not transforms:
+        builder = BuildMol(compact=True)
+        tokenize(smiles, builder)
+        return builder.mol
     builder = BuildMol()
     tokenize(smiles, builder)
-    mol = builder.mol
+    mol = _perceive(builder.mol, transforms, lazy)
+    if compact:
+        return CompactMolecule.from_molecule(mol)
+    return mol
 
-        
+def _perceive(mol, transforms, lazy=False):
+    if lazy:
+        return _lazy(mol, lambda mol: _perceive(mol, transforms))
     for transform in transforms:
         mol = transform(mol)
 
@@ -218,3 +291,68 @@ def smilin(smiles, transforms=[figueras.sssr, aromaticity.aromatize]):
             atom.imp_hcount = atom.hcount - atom.explicit_hcount
 
     return mol
+
+def smilin_iter(source, transforms=TRANSFORMS,
+                errors="yield", bufsize=1 << 20, lazy=False):
+    """(source)->iterator of (name, molecule)
+    Lazily convert the records of a SMILES file into molecules.
+
+    source is either the path to a .smi file or an iterable of lines.
+    Each line holds a smiles string optionally followed by whitespace
+    and a name.  Blank lines and lines starting with '#' are skipped.
+    name is None for records without a name.  Files are read through
+    a buffer of bufsize bytes, one line at a time.
+
+    errors controls what happens to records that can't be parsed
+      "yield" -> yield (name, SmilesRecordError) and carry on
+      "skip"  -> drop the record
+      "raise" -> raise the SmilesRecordError
+
+    With lazy=True perception is deferred as in smilin(), so errors
+    found by the transforms are raised when the molecule is used
+    rather than reported here.
+    """
+    if errors not in ("yield", "skip", "raise"):
+        raise ValueError("errors must be 'yield', 'skip' or 'raise'")
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, buffering=bufsize) as fh:
+            for lineno, name, mol in _smilin_lines(fh, transforms, errors,
+                                                   lazy=lazy):
+                yield name, mol
+    else:
+        for lineno, name, mol in _smilin_lines(source, transforms, errors,
+                                               lazy=lazy):
+            yield name, mol
+
+def _smilin_lines(lines, transforms, errors, start=1, lazy=False):
+    """(lines, transforms, errors, start=1, lazy=False)->iterator of (lineno, name, molecule)
+    Does the work for smilin_iter, lines are numbered from start"""
+    # one builder for every record, tokenize() resets it through begin()
+    builder = BuildMol()
+    lineno = start - 1
+    for line in lines:
+        lineno += 1
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        fields = line.split(None, 1)
+        if not fields or fields[0][:1] == "#":
+            continue
+        smiles = fields[0]
+        name = fields[1].rstrip() if len(fields) > 1 else None
+
+        try:
+            tokenize(smiles, builder)
+            mol = _perceive(builder.mol, transforms, lazy)
+        except Exception as e:
+            if errors == "skip":
+                continue
+            error = SmilesRecordError(e, smiles, name, lineno)
+            if errors == "raise":
+                raise error from e
+            yield lineno, name, error
+            continue
+
+        if name is not None:
+            mol.name = name
+        yield lineno, name, mol
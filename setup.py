@@ -15,6 +15,9 @@ setup(
     install_requires=[
         'bitarray'
     ],
+    extras_require={
+        'numpy': ['numpy']
+    },
     packages=find_packages(exclude=['tests*']),
     classifiers=[
         'Development Status :: 3 - Alpha',
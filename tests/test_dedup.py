@@ -0,0 +1,48 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from nose.tools import *
+from pinky.smiles import smilin
+from pinky.dedup import dedup, main
+
+class DedupTestCase(TestCase):
+    def setUp(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+
+    def test_dedup(self):
+        lines = ["c1ccccc1O phenol", "Oc1ccccc1", "C1CC bad", "CCO ethanol",
+                 "", "OCC\tethanol 2", "c1ccccc1O phenol again"]
+        phenol = smilin("c1ccccc1O").cansmiles(ranking="refine")
+        ethanol = smilin("CCO").cansmiles(ranking="refine")
+        expected = sorted([
+            "%s\t6\tphenol\t0:2\tphenol again\tphenol\t1:2\tphenol again"
+            % phenol,
+            "%s\t4\tethanol\tethanol 2\tethanol\tethanol 2" % ethanol])
+        for processes in (1, 2):
+            for key in ("smiles", "hash"):
+                out = io.StringIO()
+                errors = io.StringIO()
+                # tiny runs, merges and id buffers to go through the
+                # on disk paths
+                stats = dedup([lines, lines], out, processes=processes,
+                              chunksize=2, key=key, run_size=2, fan_in=2,
+                              errors=errors, id_buffer=2)
+                assert stats == (12, 2, 2)
+                assert errors.getvalue().startswith("bad\t")
+                result = out.getvalue().splitlines()
+                if key == "smiles":
+                    assert result == expected
+                else:
+                    assert sorted(result) == expected
+        assert_raises(ValueError, dedup, [lines], io.StringIO(), key="name")
+
+    def test_dedup_main(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "unique.smi")
+            smiles = os.path.join(self.path, "smiles.txt")
+            main([smiles, smiles, "-o", output, "-p", "1",
+                  "--run-size", "100", "--tmpdir", tmpdir])
+            counts = [int(line.split("\t")[1]) for line in open(output)]
+            assert sum(counts) == 822
+            assert os.listdir(tmpdir) == ["unique.smi"]
@@ -1,7 +1,9 @@
 from unittest import TestCase
 from nose.tools import *
 from pinky.smiles import smilin
-from pinky.fingerprints import ecfp
+from pinky.fingerprints import ecfp, ecfp_bits, ecfp_array, ecfp_counts, hash32, hash64
+from pinky.fingerprints.ecfp import gen_hash
+from pinky.fingerprints.batch import ecfp_batch
 
 class ECFPTestCase(TestCase):
     def test_ecfp(self):
@@ -23,3 +25,75 @@ class ECFPTestCase(TestCase):
         # ECFP_6
         fp = ecfp(mol, radius=3)
         assert len(fp) == 14
+
+    def test_ecfp_stable_hash(self):
+        """Stable hashes give the same identifiers everywhere"""
+        mol = smilin('CCCC(=O)N')
+        for hashfunc in (hash32, hash64):
+            for radius, size in ((0, 5), (1, 11), (2, 14), (3, 14)):
+                assert len(ecfp(mol, radius=radius, hashfunc=hashfunc)) == size
+
+        fp = ecfp(mol, radius=1, hashfunc=hash32)
+        assert sorted(fp.items()) == [
+            (283444424, 2), (284193168, 1), (284765550, 1), (542419872, 1),
+            (1466378009, 1), (1699517339, 1), (1912129899, 1),
+            (2942336601, 1), (3502760020, 1), (3504290934, 1),
+            (3542841112, 1)]
+        assert max(ecfp(mol, radius=2, hashfunc=hash64)) < 2**64
+
+    def test_ecfp_folded(self):
+        mol = smilin('CCCC(=O)N')
+        fp = ecfp(mol, radius=2, hashfunc=hash32)
+        folded = set(i % 1024 for i in fp)
+
+        bits = ecfp_bits(mol, radius=2, nbits=1024, hashfunc=hash32)
+        assert len(bits) == 1024
+        assert set(bits.search(1)) == folded
+
+        for dtype in ('uint8', 'uint64'):
+            words = ecfp_array(mol, radius=2, nbits=1024, hashfunc=hash32,
+                               dtype=dtype)
+            size = words.dtype.itemsize * 8
+            assert len(words) == 1024 // size
+            found = set(w * size + b for w in range(len(words))
+                        for b in range(size) if (int(words[w]) >> b) & 1)
+            assert found == folded
+
+        counts = ecfp_counts(mol, radius=2, nbits=1024, hashfunc=hash32)
+        assert len(counts) == 1024
+        assert counts.sum() == sum(fp.values())
+        for i, count in fp.items():
+            assert counts[i % 1024] >= count
+
+        with self.assertRaises(ValueError):
+            ecfp_array(mol, nbits=1000, dtype='uint64')
+
+    def test_ecfp_large_radius(self):
+        """Atoms dropped as duplicates in one layer are still neighbors
+        of live atoms in later layers"""
+        mol = smilin('CC1=CC(Br)CCC1')
+        sizes = [len(ecfp(mol, radius=radius)) for radius in range(8)]
+        assert sizes == sorted(sizes)
+        assert ecfp(mol, radius=3) == ecfp(smilin('CC1=CC(Br)CCC1'), radius=3)
+
+    def test_ecfp_batch(self):
+        smiles = ['CCCC(=O)N', 'c1ccccc1O', 'CC1=CC(Br)CCC1', '[Na+].[Cl-]',
+                  'C' * 100, 'C1CC2CCC1C2']
+        mols = [smilin(s) for s in smiles]
+        for hashfunc in (hash32, hash64):
+            for radius in range(5):
+                indptr, indices, counts = ecfp_batch(mols, radius=radius,
+                                                     hashfunc=hashfunc)
+                assert len(indptr) == len(mols) + 1
+                for i, mol in enumerate(mols):
+                    row = slice(indptr[i], indptr[i+1])
+                    fp = dict(zip(indices[row].tolist(), counts[row].tolist()))
+                    assert fp == ecfp(mol, radius=radius, hashfunc=hashfunc)
+
+        dense = ecfp_batch(mols, nbits=256, dense=True)
+        assert dense.shape == (len(mols), 256)
+        for i, mol in enumerate(mols):
+            assert (dense[i] == ecfp_counts(mol, nbits=256, hashfunc=hash32)).all()
+
+        with self.assertRaises(ValueError):
+            ecfp_batch(mols, hashfunc=gen_hash)
@@ -0,0 +1,40 @@
+import os
+from unittest import TestCase
+from nose.tools import *
+from pinky.smiles import smilin
+from pinky.fingerprints import ecfp, ecfp_bits
+from pinky.parallel import fingerprints
+
+class ParallelTestCase(TestCase):
+    def setUp(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+
+    def test_fingerprints(self):
+        lines = ["CCCC(=O)N butyramide", "C1CC bad", "", "c1ccccc1O phenol"]
+        lines = lines * 10
+        for processes in (1, 2):
+            records = list(fingerprints(lines, processes=processes,
+                                        chunksize=3, canonical=True, radius=1))
+            assert len(records) == 30
+            for i, rec in enumerate(records):
+                assert rec.lineno == (i // 3) * 4 + [1, 2, 4][i % 3]
+                if rec.name == "bad":
+                    assert rec.fp is None and rec.error
+                else:
+                    mol = smilin(lines[rec.lineno - 1].split()[0])
+                    assert rec.error is None
+                    assert rec.fp == ecfp(mol, radius=1)
+                    assert rec.cansmiles == mol.cansmiles()
+
+    def test_fingerprints_file(self):
+        records = list(fingerprints("{}/smiles.txt".format(self.path),
+                                    processes=2, chunksize=50))
+        assert len(records) == 411
+        assert [rec.lineno for rec in records] == list(range(1, 412))
+        assert not [rec for rec in records if rec.error]
+
+    def test_fingerprints_folded(self):
+        lines = ["CCCC(=O)N", "c1ccccc1O"]
+        records = list(fingerprints(lines, processes=2, nbits=512))
+        for line, rec in zip(lines, records):
+            assert rec.fp == ecfp_bits(smilin(line), nbits=512)
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from nose.tools import *
+from pinky.canonicalization.primes import Primes
+
+# every prime below 20000 by trial division
+FOUND = [n for n in range(2, 20000)
+         if all(n % d for d in range(2, int(n ** 0.5) + 1))]
+
+class PrimesTestCase(TestCase):
+    def test_primes(self):
+        table = Primes()
+        assert [table.get(i) for i in range(len(FOUND))] == FOUND
+        assert table[len(FOUND)] == 20011
+        table = Primes(5000)
+        assert len(table.primes) >= 5000
+
+    def test_threads(self):
+        # grow the same table from several threads at once
+        table = Primes()
+        indices = list(range(len(FOUND))) + [10000, 30000]
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(table.get, reversed(indices)))
+        reference = Primes()
+        expected = FOUND + [reference.get(10000), reference.get(30000)]
+        assert results[::-1] == expected
@@ -0,0 +1,105 @@
+import os
+import tempfile
+from unittest import TestCase
+from nose.tools import *
+import numpy as np
+from pinky.smiles import smilin
+from pinky.fingerprints import ecfp_bits, hash32
+from pinky.fingerprints.similarity import SimilarityIndex
+from pinky.fingerprints.fpdb import FingerprintWriter, FingerprintDB
+
+def tanimoto(a, b):
+    union = (a | b).count()
+    return (a & b).count() / union if union else 0.0
+
+class SimilarityTestCase(TestCase):
+    def setUp(self):
+        path = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(path, 'smiles.txt')) as fh:
+            smiles = [line.strip() for line in fh][:200]
+        self.smiles = smiles
+        self.fps = [ecfp_bits(smilin(s), nbits=512, hashfunc=hash32)
+                    for s in smiles]
+        self.index = SimilarityIndex.from_bits(self.fps)
+
+    def test_threshold(self):
+        assert len(self.index) == len(self.fps)
+        for query in self.fps[:20]:
+            expected = [tanimoto(query, fp) for fp in self.fps]
+            for threshold in (0.0, 0.3, 0.7, 1.0):
+                rows, scores = self.index.threshold(query, threshold)
+                hits = [i for i, s in enumerate(expected) if s >= threshold]
+                assert sorted(rows.tolist()) == hits
+                assert np.allclose(scores, [expected[i] for i in rows])
+                assert (np.diff(scores) <= 0).all()
+
+    def test_topk(self):
+        for query in self.fps[:20]:
+            expected = sorted((tanimoto(query, fp) for fp in self.fps),
+                              reverse=True)
+            rows, scores = self.index.topk(query, 10)
+            assert len(rows) == 10
+            assert np.allclose(scores, expected[:10])
+            for i, score in zip(rows, scores):
+                assert abs(tanimoto(query, self.fps[i]) - score) < 1e-12
+
+            rows, scores = self.index.topk(query, 10, threshold=0.5)
+            assert len(rows) == min(10, sum(s >= 0.5 for s in expected))
+        assert len(self.index.topk(self.fps[0], 0)[0]) == 0
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            SimilarityIndex(np.zeros((3, 4), dtype=np.uint8))
+        with self.assertRaises(ValueError):
+            self.index.threshold(ecfp_bits(smilin('CCO'), nbits=1024))
+        for threshold in (-0.1, 1.5, float('nan')):
+            with self.assertRaises(ValueError):
+                self.index.threshold(self.fps[0], threshold)
+            with self.assertRaises(ValueError):
+                self.index.topk(self.fps[0], 10, threshold)
+
+    def test_fpdb(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.fpdb')
+            with FingerprintWriter(path, nbits=512) as writer:
+                for i, fp in enumerate(self.fps):
+                    writer.add(fp, 'mol%d' % i, self.smiles[i])
+            assert os.listdir(tmp) == ['test.fpdb']
+
+            with FingerprintDB(path) as db:
+                assert len(db) == len(self.fps)
+                assert not db.fps.flags.writeable
+                counts = db.counts()
+                assert (np.diff(counts) >= 0).all()
+                seen = set()
+                for row in range(len(db)):
+                    i = int(db.name(row)[3:])
+                    seen.add(i)
+                    assert db.smiles(row) == self.smiles[i]
+                    assert db.fps[row].tobytes() == self.fps[i].tobytes()
+                    assert counts[row] == self.fps[i].count()
+                assert len(seen) == len(self.fps)
+
+                index = db.index()
+                assert index.order is None and index.fps is db.fps
+                query = self.fps[3]
+                rows, scores = index.threshold(query, 0.5)
+                expected = self.index.threshold(query, 0.5)
+                assert sorted(db.name(i) for i in rows) == \
+                    sorted('mol%d' % i for i in expected[0])
+
+            with self.assertRaises(ValueError):
+                FingerprintWriter(path, nbits=100)
+            with open(path, 'wb') as fh:
+                fh.write(b'not a fingerprint file' * 4)
+            with self.assertRaises(ValueError):
+                FingerprintDB(path)
+
+            # a failed close leaves no temporary file behind
+            path = os.path.join(tmp, 'directory.fpdb')
+            os.mkdir(path)
+            writer = FingerprintWriter(path, nbits=512)
+            writer.add(self.fps[0], 'mol0', self.smiles[0])
+            with self.assertRaises(OSError):
+                writer.close()
+            assert sorted(os.listdir(tmp)) == ['directory.fpdb', 'test.fpdb']
@@ -1,8 +1,19 @@
+import io
 import os
+import random
 from unittest import TestCase
 from nose.tools import *
-from pinky.smiles import smilin
-from pinky.exceptions import PinkyError
+from pinky.smiles import smilin, smilin_iter, SmilesCache
+from pinky.fingerprints import ecfp, hash32
+from pinky.mol import Atom, Molecule
+from pinky.mol.lazy import LazyMolecule
+from pinky.mol.compact import CompactMolecule
+from pinky.smiles.parser import tokenize
+from pinky.smiles.handler import SaveTokens
+from pinky.perception import figueras
+from pinky.canonicalization import traverse, smiles
+from pinky import budget
+from pinky.exceptions import PinkyError, SmilesRecordError, TooComplexError
 
 class SmilesTestCase(TestCase):
     def setUp(self):
@@ -24,3 +35,378 @@ class SmilesTestCase(TestCase):
                 print(atom, atom.sumBondOrders())
                 
             print(smile, out, can)
+
+    def test_tokenize(self):
+        tokens = SaveTokens()
+        tokenize("ClC(=O)[13CH3+]%10.Br%10", tokens)
+        assert list(tokens) == [
+            ("raw_atom", 0, "Cl"),
+            ("raw_atom", 2, "C"),
+            ("open_branch", 3, "("),
+            ("bond", 4, "="),
+            ("raw_atom", 5, "O"),
+            ("close_branch", 6, ")"),
+            ("open_bracket", 7, "["),
+            ("weight", 7, "13"),
+            ("element", 7, "C"),
+            ("hcount", 7, "H3"),
+            ("positive_symbols", 7, "+"),
+            ("close_bracket", 7, "]"),
+            ("closure", 15, "%10"),
+            ("dot", 18, "."),
+            ("raw_atom", 19, "Br"),
+            ("closure", 21, "%10"),
+        ]
+
+    def test_tokenize_errors(self):
+        errors = [
+            ("C((C))", "Unknown character at position 2"),
+            ("C..C", "Unknown character at position 2"),
+            ("C%", "Unknown character at position 1"),
+            ("[Cx]", "Unknown character at position 2"),
+            ("CC[C", "Missing ']' at position 4"),
+        ]
+        for smile, msg in errors:
+            with self.assertRaises(ValueError) as cm:
+                tokenize(smile, SaveTokens())
+            assert str(cm.exception).startswith(msg), str(cm.exception)
+
+    def test_smilin_iter(self):
+        records = list(smilin_iter("{}/smiles.txt".format(self.path)))
+        assert len(records) == 411
+        for name, mol in records:
+            assert name is None
+            assert len(mol.atoms) > 0
+
+        fh = io.StringIO("# comment\nCCO ethanol\n\nC1CC bad ring\nc1ccccc1\tbenzene\n")
+        records = list(smilin_iter(fh))
+        assert [name for name, mol in records] == ["ethanol", "bad ring", "benzene"]
+        assert records[0][1].cansmiles() == "OCC"
+        assert records[0][1].name == "ethanol"
+        error = records[1][1]
+        assert isinstance(error, SmilesRecordError)
+        assert error.lineno == 4
+        assert error.smiles == "C1CC"
+
+        records = list(smilin_iter(["CCO", "C1CC", "CCN"], errors="skip"))
+        assert [mol.cansmiles() for name, mol in records] == ["OCC", "C(N)C"]
+
+        with self.assertRaises(SmilesRecordError):
+            list(smilin_iter(["CCO", "C1CC"], errors="raise"))
+
+    def test_smiles_cache(self):
+        cache = SmilesCache(maxsize=2)
+        first = cache.smilin('c1ccccc1O')
+        second = cache.smilin('c1ccccc1O')
+        assert first is not second
+        assert not set(map(id, first.atoms)) & set(map(id, second.atoms))
+        assert second.cansmiles() == smilin('c1ccccc1O').cansmiles()
+        assert ecfp(second, hashfunc=hash32) == \
+            ecfp(smilin('c1ccccc1O'), hashfunc=hash32)
+        assert len(second.cycles) == 1
+        assert second.atoms[0].rings[0] is second.cycles[0]
+
+        # changing a copy leaves the cache alone
+        first.remove_atom(first.atoms[-1])
+        assert len(cache.smilin('c1ccccc1O').atoms) == 7
+
+        cache.smilin('CCO')
+        cache.smilin('CCN')
+        assert 'c1ccccc1O' not in cache
+        info = cache.info()
+        assert (info.hits, info.misses, info.currsize) == (2, 3, 2)
+
+        with self.assertRaises(AssertionError):
+            cache.smilin('C1CC')
+        assert cache.info().currsize == 2
+
+        small = SmilesCache(maxsize=100, maxbytes=1)
+        small.smilin('CCO')
+        assert len(small) == 0
+        cache.clear()
+        assert cache.info() == (0, 0, 2, 0, 0)
+
+    def test_lazy(self):
+        smiles = 'c1ccccc1C(=O)N'
+        eager = smilin(smiles)
+        mol = smilin(smiles, lazy=True)
+        assert isinstance(mol, LazyMolecule)
+        assert len(mol.atoms) == 9
+        assert [a.symbol for a in mol.atoms] == [a.symbol for a in eager.atoms]
+        assert isinstance(mol, LazyMolecule)
+
+        # the first access to a perceived property runs the transforms
+        assert mol.atoms[0].aromatic == 1
+        assert type(mol) is Molecule and type(mol.atoms[0]) is Atom
+        assert len(mol.cycles) == 1
+        assert ecfp(mol, hashfunc=hash32) == ecfp(eager, hashfunc=hash32)
+
+        for read in (lambda m: m.cycles, lambda m: m.cansmiles(),
+                     lambda m: m.atoms[3].hcount, lambda m: m.bonds[0].bondtype,
+                     lambda m: m.copy(), lambda m: ecfp(m)):
+            calls = []
+            mol = smilin(smiles, [lambda m: calls.append(m) or m], lazy=True)
+            read(mol)
+            read(mol)
+            assert calls == [mol]
+
+        # a failed perception is raised again by the next access
+        def fail(mol):
+            raise PinkyError("no perception")
+        mol = smilin(smiles, [fail], lazy=True)
+        assert_raises(PinkyError, lambda: mol.atoms[0].aromatic)
+        assert_raises(PinkyError, mol.cansmiles)
+        assert type(mol) is LazyMolecule
+        try:
+            budget.configure(atoms=5)
+            mol = smilin(smiles, lazy=True)
+            assert_raises(TooComplexError, mol.cansmiles)
+            assert_raises(TooComplexError, lambda: mol.cycles)
+        finally:
+            budget.configure(atoms=None)
+            budget.reset()
+        assert mol.cansmiles() == eager.cansmiles()
+
+        # syntax errors are still raised by smilin
+        with self.assertRaises(AssertionError):
+            smilin('C1CC', lazy=True)
+        names = [name for name, mol in smilin_iter(['CCO a', 'c1cc b'],
+                                                   lazy=True)]
+        assert names == ['a', 'b']
+
+    def test_compact(self):
+        with open("{}/smiles.txt".format(self.path)) as fh:
+            smiles = [line.strip() for line in fh][:100]
+        smiles += ['N[C@@H](C)C(=O)O', '[13CH4]', '[NH4+].[Cl-]']
+        for smile in smiles:
+            mol = smilin(smile)
+            compact = smilin(smile, compact=True)
+            assert isinstance(compact, CompactMolecule)
+            assert compact.natoms == len(mol.atoms)
+            assert compact.nbonds == len(mol.bonds)
+            assert compact.ncycles == len(mol.cycles)
+            for atom in mol.atoms:
+                assert compact.atom_symbol(atom.index) == atom.symbol
+                assert list(compact.neighbors_of(atom.index)) == \
+                    [a.index for a in atom.oatoms]
+            copy = compact.to_molecule()
+            assert ecfp(copy, hashfunc=hash32) == ecfp(mol, hashfunc=hash32)
+            assert copy.cansmiles() == mol.cansmiles()
+            assert len(copy.cycles) == len(mol.cycles)
+
+        compact = CompactMolecule.from_molecule(smilin('[13CH4]'))
+        assert compact.extra == {0: (13, None, None)}
+
+        # straight from the builder, without perception
+        compact = smilin('c1ccccc1', transforms=[], compact=True)
+        assert compact.ncycles == 0 and not compact.perceived
+        assert [flags & 1 for flags in compact.atom_flags] == [1] * 6
+
+    def test_findbond(self):
+        mol = smilin('C1CCCCC1CO')
+        for bond in mol.bonds:
+            a1, a2 = bond.atoms
+            assert a1.findbond(a2) is bond and a2.findbond(a1) is bond
+            assert bond.xatom(a1) is a2 and bond.xatom(a2) is a1
+        ring = mol.atoms[0]
+        bond = mol.bonds[0]
+        other = bond.xatom(ring)
+        mol.remove_bond(bond)
+        assert ring.findbond(other) is None
+        assert other.findbond(ring) is None
+        mol.add_bond(bond, ring, other)
+        assert ring.findbond(other) is bond
+
+    def test_ring_systems(self):
+        for smile, rings, systems in [('CCCC(=O)O', 0, 0),
+                                      ('C.C1CC1.CCO', 1, 1),
+                                      ('c1ccccc1-c1ccccc1', 2, 2),
+                                      ('C1CCC11CCCC1', 2, 2),
+                                      ('c1ccc2ccccc2c1CCC1CC1', 3, 2)]:
+            mol = smilin(smile)
+            assert figueras.cyclomatic(mol) == rings
+            assert len(figueras.ringSystems(mol)) == systems
+            assert len(mol.cycles) == rings
+
+    def test_get_ring(self):
+        # the rings found by the dictionary path getRing
+        def indices(atoms):
+            return sorted(atom.index for atom in atoms)
+        for smile, expected in [
+            ('CC12CCC3c4ccc(O)cc4CCC3C1CCC2O',
+             [[1, 2, 3, 4, 14, 15], [1, 15, 16, 17, 18],
+              [4, 5, 11, 12, 13, 14], [5, 6, 7, 8, 10, 11]]),
+            ('c1cc2ccc3cccc4ccc(c1)c2c34',
+             [[0, 1, 2, 12, 13, 14], [2, 3, 4, 5, 14, 15],
+              [5, 6, 7, 8, 9, 15], [9, 10, 11, 12, 14, 15]]),
+            ('C1CCC2CC3CC4CC5CCCCC5CC4CC3CC2C1',
+             [[0, 1, 2, 3, 20, 21], [3, 4, 5, 18, 19, 20],
+              [5, 6, 7, 16, 17, 18], [7, 8, 9, 14, 15, 16],
+              [9, 10, 11, 12, 13, 14]])]:
+            mol = smilin(smile)
+            assert sorted(indices(cycle.atoms) for cycle in mol.cycles) == \
+                   expected
+
+        # which of the equally small rings of a cage sssr keeps depends
+        # on the atom handles, only the sizes are fixed
+        for smile, sizes in [('C1C2CC3CC1CC(C2)C3', [6] * 3),
+                             ('C12C3C4C1C5C4C3C25', [4] * 5)]:
+            mol = smilin(smile)
+            assert sorted(len(cycle.atoms) for cycle in mol.cycles) == sizes
+
+        for smile, expected in [
+            ('C12C3C4C1C5C4C3C25',
+             [[0, 1, 2, 3]] * 4 + [[2, 3, 4, 5]] * 2 +
+             [[1, 2, 5, 6], [0, 1, 6, 7]]),
+            ('C1C2CC3CC1CC(C2)C3',
+             [[0, 1, 2, 3, 4, 5]] * 6 + [[0, 1, 5, 6, 7, 8]] * 3 +
+             [[1, 2, 3, 7, 8, 9]])]:
+            mol = smilin(smile, transforms=[])
+            lookup = dict((atom.handle, atom) for atom in mol.atoms)
+            oatoms = dict((atom.handle, atom.oatoms) for atom in mol.atoms)
+            found = []
+            for atom in mol.atoms:
+                ring, bonds = figueras.getRing(atom, lookup, lookup, oatoms)
+                assert len(bonds) == len(ring)
+                found.append(indices(map(lookup.get, ring)))
+            assert found == expected
+
+    def test_budget(self):
+        c60 = ("c12c3c4c5c1c6c7c8c2c9c1c3c2c3c4c4c%10c5c5c6c6c7c7c%11c8c9"
+               "c8c9c1c2c1c2c3c4c3c4c%10c5c5c6c6c7c7c%11c8c8c9c1c1c2c3c2"
+               "c4c5c6c3c7c8c1c23")
+        lines = ["CCO ethanol", c60 + " c60", "c1ccccc1 benzene"]
+        budget.reset()
+        try:
+            budget.configure(atoms=30)
+            results = list(smilin_iter(lines))
+            assert results[0][1].cansmiles() == 'OCC'
+            assert isinstance(results[1][1], SmilesRecordError)
+            assert isinstance(results[1][1].error, TooComplexError)
+            assert results[2][0] == 'benzene'
+
+            budget.configure(atoms=None, expansions=100)
+            assert_raises(TooComplexError, smilin, c60)
+            smilin('CCCC(=O)N')
+
+            budget.configure(expansions=None, rounds=3)
+            mol = smilin(c60)
+            assert_raises(PinkyError, mol.cansmiles)
+            assert budget.trips() == {'atoms': 1, 'expansions': 1,
+                                      'rounds': 1}
+            assert_raises(ValueError, budget.configure, bonds=10)
+
+            # getRing stops as soon as the budget runs out
+            mol = smilin('C1' + 'C' * 1000 + 'C1', transforms=[])
+            lookup = dict((atom.handle, atom) for atom in mol.atoms)
+            oatoms = dict((atom.handle, atom.oatoms) for atom in mol.atoms)
+            work = budget.Budget('expansions', 10)
+            assert_raises(TooComplexError, figueras.getRing, mol.atoms[0],
+                          lookup, lookup, oatoms, work)
+            assert work.left == -1
+        finally:
+            budget.configure(atoms=None, expansions=None, rounds=None)
+            budget.reset()
+        assert len(smilin(c60).cycles) == 31
+
+    def test_refine_ranking(self):
+        rng = random.Random(0)
+        for smile in ['NCCCCCN', 'C(CCNCCCN)CN', 'c1cc(c(cc1C(=O)O)C(=O)O)C(=O)O',
+                      'C12C3C4C1C5C4C3C25', 'C1CC1C1CC1C1CC1.CCO']:
+            canonical = smilin(smile).cansmiles(ranking="refine")
+            for trial in range(5):
+                mol = smilin(smile)
+                rng.shuffle(mol.atoms)
+                other = smilin(mol.arbsmiles())
+                assert other.cansmiles(ranking="refine") == canonical
+        # the two engines order the atoms differently
+        mol = smilin('NCCCCCN')
+        assert mol.cansmiles(ranking="refine") == 'C(CCN)CCN'
+        assert mol.cansmiles() == 'C(CCCN)CN'
+        assert_raises(ValueError, mol.cansmiles, ranking="primes")
+
+    def test_deep_traversal(self):
+        # far deeper than the recursion limit
+        for smile in ['C' * 10000, 'N' + 'CC(=O)N' * 2500 + 'CC(=O)O']:
+            mol = smilin(smile)
+            assert mol.arbsmiles() == smile
+        mol = smilin('C(C)(C)' * 3000)
+        assert smilin(mol.arbsmiles()).arbsmiles() == mol.arbsmiles()
+
+    def test_writer(self):
+        pairs = [(smiles.SmilesTraversal, smiles.SmilesWriter),
+                 (smiles.SmartsTraversal, smiles.SmartsWriter),
+                 (smiles.IsomericSmilesTraversal, smiles.IsomericSmilesWriter)]
+        for smile in ['C1CC2CCC1CC2.[Na+].[Cl-]', 'c1cc[nH]c1', 'F/C=C/F',
+                      'N[C@@H](C)C(=O)O', '[13CH3]C(=O)[O-]',
+                      'C12C3C4C5C1C6C7C2C8C3C9C4C%10C5C6C%11C7C8C9C%10%11',
+                      'C12C3C4C1C5C4C3C25']:
+            mol = smilin(smile)
+            mol.cansmiles()
+            for tokens, writer in pairs:
+                assert traverse.draw(mol, writer) == \
+                       traverse.draw(mol, tokens)
+        # the ring closure of a chiral atom counts where it is written,
+        # as the parser reads it back
+        mol = smilin('C([C@@H]1[C@H]([C@@H]([C@H](C(O1)O)O)O)O)OP(=O)(O)O')
+        mol.cansmiles()
+        assert traverse.drawIsomeric(mol)[0] == \
+               'O=P(OC[C@@H]1OC([C@@H]([C@@H]([C@@H]1O)O)O)O)(O)O'
+
+    def test_canonical_hash(self):
+        rng = random.Random(0)
+        phenol = smilin('c1ccccc1O')
+        # the digest must not change between versions and platforms
+        assert phenol.canonical_hash() == 12865868425718841641
+        assert phenol.canonical_hash(128) >> 64 == phenol.canonical_hash()
+        hashes = set()
+        for smile in ['c1ccccc1O', 'Cc1ccccc1', 'C(CCNCCCN)CN',
+                      'C12C3C4C1C5C4C3C25', 'C1CC1C1CC1C1CC1.CCO', 'CCO.CCO']:
+            key = smilin(smile).canonical_hash()
+            hashes.add(key)
+            for trial in range(5):
+                mol = smilin(smile)
+                rng.shuffle(mol.atoms)
+                assert smilin(mol.arbsmiles()).canonical_hash() == key
+        assert len(hashes) == 6
+        # cached until the molecule changes
+        mol = smilin('CCO')
+        key = mol.canonical_hash()
+        assert mol.canonical_hash() == key
+        assert ("hash", "refine") in mol._cache
+        mol.remove_bond(mol.bonds[-1])
+        assert mol.dirty and not mol._cache
+        assert mol.canonical_hash() != key
+        assert_raises(ValueError, mol.canonical_hash, bits=32)
+        assert_raises(ValueError, mol.canonical_hash, ranking="freed")
+
+    def test_derived_cache(self):
+        from pinky.mol import molecule
+        ranked = []
+        freed = molecule.RANKINGS["freed"]
+        def counting(mol):
+            ranked.append(mol)
+            return freed(mol)
+        molecule.RANKINGS["freed"] = counting
+        try:
+            mol = smilin('N[C@@H](Cc1ccccc1)C(=O)O')
+            canonical = mol.cansmiles()
+            isomeric = mol.cansmiles(isomeric=1)
+            smarts = mol.arbsmarts()
+            refined = mol.cansmiles(ranking="refine")
+            assert mol.cansmiles() == canonical
+            assert mol.cansmiles(isomeric=1) == isomeric
+            assert mol.arbsmarts() == smarts
+            assert mol.cansmiles(ranking="refine") == refined
+            assert len(ranked) == 1
+            # the symorders of each engine are put back on the atoms
+            assert traverse.draw(mol)[0] == canonical
+            assert '@' in isomeric
+
+            mol.remove_atom(mol.atoms[-1])
+            assert mol.dirty and not mol._cache
+            pruned = mol.copy()
+            assert mol.cansmiles() == pruned.cansmiles() != canonical
+            assert len(ranked) == 3
+        finally:
+            molecule.RANKINGS["freed"] = freed
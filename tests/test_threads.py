@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from nose.tools import *
+from pinky import budget
+from pinky.exceptions import TooComplexError
+from pinky.fingerprints import ecfp
+from pinky.mol.idgen import IdGenerator
+from pinky.smiles import smilin, SmilesCache
+
+def pipeline(smiles, lazy=False):
+    mol = smilin(smiles, lazy=lazy)
+    fp = ecfp(mol, radius=2)
+    return (mol.cansmiles(), mol.cansmiles(ranking="refine"),
+            mol.canonical_hash(), mol.arbsmiles(), mol.arbsmarts(),
+            sorted(fp.items()))
+
+class ThreadsTestCase(TestCase):
+    def setUp(self):
+        path = os.path.dirname(os.path.abspath(__file__))
+        self.smiles = [line.split()[0]
+                       for line in open(os.path.join(path, "smiles.txt"))
+                       if line.strip()]
+
+    def test_pipeline(self):
+        expected = [pipeline(smiles) for smiles in self.smiles]
+        with ThreadPoolExecutor(8) as pool:
+            results = pool.map(pipeline, self.smiles)
+            assert list(results) == expected
+            results = pool.map(pipeline, self.smiles[::4],
+                               [True] * len(self.smiles[::4]))
+            assert list(results) == expected[::4]
+
+        cache = SmilesCache(maxsize=100)
+        def cached(smiles):
+            return cache.smilin(smiles).cansmiles()
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(cached, self.smiles * 2))
+        assert results == [result[0] for result in expected] * 2
+
+    def test_arbsmiles(self):
+        mol = smilin("c1ccccc1CC(=O)O")
+        mol.cansmiles()
+        symorders = [atom.symorder for atom in mol.atoms]
+        mol.arbsmiles()
+        assert [atom.symorder for atom in mol.atoms] == symorders
+
+    def test_idgen(self):
+        generator = IdGenerator()
+        def ids(n):
+            return [generator() for i in range(n)]
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(ids, [1000] * 8))
+        assert sorted(sum(results, [])) == list(range(1, 8001))
+
+    def test_budget(self):
+        # every thread has its own budgets and trips
+        result = {}
+        def limited():
+            budget.configure(atoms=3)
+            assert_raises(TooComplexError, smilin, "CCCCC")
+            result["trips"] = budget.trips()
+        try:
+            budget.reset()
+            budget.configure(rounds=1000)
+            thread = threading.Thread(target=limited)
+            thread.start()
+            thread.join()
+            assert result["trips"] == {"atoms": 1}
+            assert budget.trips() == {}
+            assert budget.limits() == {"atoms": None, "expansions": None,
+                                       "rounds": 1000}
+            smilin("CCCCC").cansmiles()
+        finally:
+            budget.configure(rounds=None)
+            budget.reset()